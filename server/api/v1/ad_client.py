@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+""" Client of the AD service users authenticate against """
+import asyncio
+import hashlib
+import hmac
+import os
+import threading
+import time
+from os import getenv
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from models.engine.cache import TTLCache
+
+try:
+  import httpx
+except ImportError:
+  httpx = None
+
+
+class ADServiceError(Exception):
+  """ The AD service could not be reached or gave an invalid answer """
+
+
+class CircuitOpenError(ADServiceError):
+  """ Calls to the AD service are suspended after repeated failures """
+
+
+class CircuitBreaker:
+  """ Fails calls fast for reset_timeout seconds once max_failures
+  calls in a row have failed, then lets one trial call through
+  """
+
+  def __init__(self, max_failures=5, reset_timeout=30):
+    """ Instantiate a closed CircuitBreaker """
+    self.max_failures = max_failures
+    self.reset_timeout = reset_timeout
+    self.failures = 0
+    self.opened_at = None
+    self.__trial = False
+    self.__lock = threading.Lock()
+
+  def before_call(self):
+    """ Raises CircuitOpenError if the call must not be made """
+    with self.__lock:
+      if self.opened_at is None:
+        return
+      if (time.monotonic() - self.opened_at < self.reset_timeout or
+          self.__trial):
+        raise CircuitOpenError("AD service calls are suspended")
+      self.__trial = True
+
+  def record_success(self):
+    """ Closes the circuit """
+    with self.__lock:
+      self.failures = 0
+      self.opened_at = None
+      self.__trial = False
+
+  def record_failure(self):
+    """ Counts a failure, opening the circuit past max_failures """
+    with self.__lock:
+      self.failures += 1
+      self.__trial = False
+      if self.failures >= self.max_failures:
+        self.opened_at = time.monotonic()
+
+
+class ADClient:
+  """ Authenticates users against the AD service over a pool of
+  keep-alive connections, caching the profiles it returns
+  """
+
+  def __init__(self, url, connect_timeout=3, read_timeout=10, retries=2,
+               pool_size=10, cache_ttl=60, breaker=None):
+    """ Instantiate an ADClient """
+    self.url = url
+    self.timeout = (connect_timeout, read_timeout)
+    self.breaker = breaker or CircuitBreaker()
+    self.session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.2,
+                  status_forcelist=(502, 503, 504),
+                  allowed_methods=frozenset(["POST"]),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                          max_retries=retry)
+    self.session.mount("https://", adapter)
+    self.session.mount("http://", adapter)
+    self.__cache = TTLCache(ttl=cache_ttl) if cache_ttl > 0 else None
+    self.pool_size = pool_size
+    self.retries = retries
+    self.__async_session = None
+    self.__secret = os.urandom(32)
+
+  def __cache_key(self, credentials):
+    """ Keyed hash of credentials, so they are never kept in memory """
+    message = "{}\0{}".format(credentials.get("username"),
+                              credentials.get("password"))
+    return hmac.new(self.__secret, message.encode(),
+                    hashlib.sha256).hexdigest()
+
+  def __cached(self, key):
+    """ Gets the cached answer of a credentials hash """
+    if self.__cache is not None:
+      return self.__cache.get(key)
+    return None
+
+  def __record(self, key, status_code, answer):
+    """ Updates the breaker and the cache with an AD service answer """
+    if status_code >= 500:
+      self.breaker.record_failure()
+    else:
+      self.breaker.record_success()
+    if self.__cache is not None and answer.get("status_code") == "200":
+      self.__cache.set(key, answer)
+
+  def authenticate(self, credentials):
+    """ Posts credentials to the AD service and returns its JSON answer.
+    Successful answers are cached for the same credentials.
+    """
+    key = self.__cache_key(credentials)
+    cached = self.__cached(key)
+    if cached is not None:
+      return cached
+    self.breaker.before_call()
+    try:
+      response = self.session.post(self.url, data=credentials,
+                                   timeout=self.timeout)
+      answer = response.json()
+    except (requests.exceptions.RequestException, ValueError) as err:
+      self.breaker.record_failure()
+      raise ADServiceError(str(err)) from err
+    self.__record(key, response.status_code, answer)
+    return answer
+
+  async def authenticate_async(self, credentials):
+    """ Same as authenticate, without blocking the event loop. Uses
+    httpx when installed, else runs authenticate on a worker thread.
+    """
+    if httpx is None:
+      return await asyncio.to_thread(self.authenticate, credentials)
+    key = self.__cache_key(credentials)
+    cached = self.__cached(key)
+    if cached is not None:
+      return cached
+    self.breaker.before_call()
+    if self.__async_session is None:
+      self.__async_session = httpx.AsyncClient(
+        timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+        limits=httpx.Limits(max_connections=self.pool_size),
+        transport=httpx.AsyncHTTPTransport(retries=self.retries))
+    try:
+      response = await self.__async_session.post(self.url, data=credentials)
+      answer = response.json()
+    except (httpx.HTTPError, ValueError) as err:
+      self.breaker.record_failure()
+      raise ADServiceError(str(err)) from err
+    self.__record(key, response.status_code, answer)
+    return answer
+
+  async def aclose(self):
+    """ Closes the connections of authenticate_async """
+    if self.__async_session is not None:
+      await self.__async_session.aclose()
+      self.__async_session = None
+
+
+ad_client = ADClient(
+  getenv("AD_AUTH_URL", "https://adservice.abujaelectricity.com/auth/detail"),
+  connect_timeout=float(getenv("AD_CONNECT_TIMEOUT", 3)),
+  read_timeout=float(getenv("AD_READ_TIMEOUT", 10)),
+  retries=int(getenv("AD_RETRIES", 2)),
+  pool_size=int(getenv("AD_POOL_SIZE", 10)),
+  cache_ttl=float(getenv("AD_CACHE_TTL", 60)),
+  breaker=CircuitBreaker(int(getenv("AD_BREAKER_FAILURES", 5)),
+                         float(getenv("AD_BREAKER_RESET", 30))))
@@ -2,46 +2,22 @@
 """ Flask Application """
 from models import storage
 from api.v1.views import app_views
+from api.v1.json_provider import OrjsonProvider, orjson
+from api.v1.metrics import init_metrics
 from os import environ
 from flask import Flask, make_response, jsonify
-from flasgger import Swagger
-from celery.schedules import crontab
-from ..celery_config import celery_init_app
 from flask_cors import CORS
 import logging
 
-app = Flask(__name__)
 logger = logging.getLogger(__name__)
-cors = CORS(app, resources={r"/*": {"origins": "*"}})
-app.config.from_mapping(
-    CELERY=dict(
-        broker_url="redis://localhost:6379/0",
-        result_backend="redis://localhost:6379/0",
-        task_ignore_result=True,
-    ),
-)
-# app.config.from_prefixed_env()
-# app.extensions["celery"] = celery_app
-# app.config["CELERY_CONFIG"] = {
-#     "broker_url": "redis://localhost:6379",
-#     "result_backend": "redis://localhost:6379"
-# }
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
-app.config['SWAGGER'] = {
-    'title': 'AEDC Subscription Tracking Application',
-    'uiversion': 3
-}
-
-celery_app = celery_init_app(app)
-app.register_blueprint(app_views)
 logging.basicConfig(filename='app.log', level=logging.DEBUG)
 
-@app.teardown_appcontext
+
 def close_db(error):
     """ Close storage"""
     storage.close()
 
-@app.errorhandler(404)
+
 def not_found(error):
     """ 404 Error
     ---
@@ -51,11 +27,102 @@ def not_found(error):
     """
     return make_response(jsonify({'error': "Not found"}), 404)
 
-Swagger(app)
+
+def create_db():
+    """ Creates the tables that do not exist yet """
+    storage.create_all()
+    print("Database tables created")
+
+
+def backfill_notifications():
+    """ Adds and fills the next_notification_at column of subscriptions
+    created before it existed
+    """
+    print("{} subscriptions scheduled".format(
+        storage.backfill_next_notification()))
+
+
+def rebuild_summary():
+    """ Recounts the subscription summary with today's expiry buckets """
+    print("{} summary rows".format(storage.rebuild_subscription_summary()))
+
+
+def reindex_search():
+    """ Rebuilds the search index of every subscription """
+    print("{} subscriptions indexed".format(storage.reindex_search()))
+
+
+def notification_scheduler():
+    """ Sends reminders as they fall due, until interrupted """
+    from api.v1.email_service import run_scheduler
+    run_scheduler()
+
+
+def create_app(swagger=None, celery=None):
+    """ Builds the Flask application. Swagger and Celery are set up
+    unless disabled with the arguments or ENABLE_SWAGGER=0 and
+    ENABLE_CELERY=0. The Celery app is in app.extensions["celery"].
+    """
+    if swagger is None:
+        swagger = environ.get("ENABLE_SWAGGER", "1") == "1"
+    if celery is None:
+        celery = environ.get("ENABLE_CELERY", "1") == "1"
+    app = Flask(__name__)
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    CORS(app, resources={r"/*": {"origins": "*"}},
+         expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"])
+    app.config.from_mapping(
+        CELERY=dict(
+            broker_url=environ.get("CELERY_BROKER_URL",
+                                   "redis://localhost:6379/0"),
+            result_backend=environ.get("CELERY_RESULT_BACKEND",
+                                       "redis://localhost:6379/0"),
+            task_ignore_result=True,
+            # run tasks in-process, e.g. with
+            # CELERY_RESULT_BACKEND=cache+memory://
+            task_always_eager=environ.get("CELERY_ALWAYS_EAGER") == "1",
+        ),
+    )
+    app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
+    app.config['SWAGGER'] = {
+        'title': 'AEDC Subscription Tracking Application',
+        'uiversion': 3
+    }
+
+    if celery:
+        from celery.schedules import crontab
+        from ..celery_config import celery_init_app
+        # just after midnight UTC, when the expiry buckets move
+        app.config["CELERY"]["beat_schedule"] = {
+            "rebuild-subscription-summary": {
+                "task": "api.v1.maintenance.rebuild_subscription_summary",
+                "schedule": crontab(hour=0, minute=5),
+            },
+        }
+        celery_init_app(app)
+        # registers the tasks with the Celery app
+        from . import email_service, maintenance  # noqa: F401
+    init_metrics(app)
+    app.register_blueprint(app_views)
+    app.teardown_appcontext(close_db)
+    app.register_error_handler(404, not_found)
+    app.cli.command("create-db")(create_db)
+    app.cli.command("backfill-notifications")(backfill_notifications)
+    app.cli.command("notification-scheduler")(notification_scheduler)
+    app.cli.command("rebuild-summary")(rebuild_summary)
+    app.cli.command("reindex-search")(reindex_search)
+    if swagger:
+        from flasgger import Swagger
+        Swagger(app)
+    return app
+
 
 if __name__ == "__main__":
     """Main Function"""
     host = '0.0.0.0'
     port = '5000'
-    app.run(debug=True, host=host, port=port, threaded=True)
+    app = create_app()
+    app.run(debug=environ.get("FLASK_DEBUG", "1") == "1", host=host,
+            port=port, threaded=True)
     logger.info("App is up and running")
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+""" ASGI entry point, e.g. uvicorn api.v1.asgi:application
+
+Logins (POST /api/v1/users) run on the event loop: the AD service is
+called with an async HTTP client and the user is looked up through
+async SQLAlchemy, so slow AD answers do not hold a thread each. Every
+other request is handed to the Flask app on a pool of ASGI_WSGI_THREADS
+worker threads.
+"""
+import asyncio
+import json
+from os import getenv
+from a2wsgi import WSGIMiddleware
+from api.v1.app import create_app
+from api.v1.ad_client import ADServiceError, CircuitOpenError, ad_client
+from models import storage
+from models.engine.async_db_storage import make_async_storage
+from models.user import User
+
+# asgiref's WsgiToAsgi would run every Flask request on one shared thread
+wsgi_application = WSGIMiddleware(
+  create_app(), workers=int(getenv("ASGI_WSGI_THREADS") or 10))
+async_storage = make_async_storage()
+
+
+async def read_body(receive):
+  """ Reads the whole body of a request """
+  body = b''
+  while True:
+    message = await receive()
+    body += message.get('body', b'')
+    if not message.get('more_body'):
+      return body
+
+
+async def send_json(send, status, payload):
+  """ Sends a JSON response """
+  body = (json.dumps(payload) + "\n").encode()
+  await send({'type': 'http.response.start', 'status': status,
+              'headers': [(b'content-type', b'application/json'),
+                          (b'content-length', str(len(body)).encode()),
+                          (b'access-control-allow-origin', b'*')]})
+  await send({'type': 'http.response.body', 'body': body})
+
+
+def find_or_create_user(user_object):
+  """ Gets the user of an AD profile, creating it on first login """
+  try:
+    user = storage.get_user_by_email(user_object['email'])
+    if user is None:
+      user = User(**user_object)
+      user.save()
+    return user.make_user_response()
+  finally:
+    storage.close()
+
+
+async def find_or_create_user_async(user_object):
+  """ find_or_create_user through async SQLAlchemy when available """
+  if async_storage is None:
+    return await asyncio.to_thread(find_or_create_user, user_object)
+  user = await async_storage.get_user_by_email(user_object['email'])
+  if user is None:
+    user = User(**user_object)
+    await async_storage.save(user)
+  return user.make_user_response()
+
+
+async def login(receive, send):
+  """ Authenticates a user against the AD service, like user_auth """
+  try:
+    request_data = json.loads(await read_body(receive))
+  except ValueError:
+    request_data = None
+  if not isinstance(request_data, dict) or not request_data:
+    return await send_json(send, 400, {'error': "Invalid JSON"})
+  for key in ('username', 'password'):
+    if key not in request_data:
+      return await send_json(send, 400, {'error': "Missing " + key})
+  try:
+    response = await ad_client.authenticate_async(request_data)
+  except CircuitOpenError:
+    return await send_json(send, 503, {
+      'error': "Authentication service unavailable"})
+  except ADServiceError:
+    return await send_json(send, 502, {
+      'error': "Authentication service error"})
+  if response.get('status_code') == '200':
+    response_data = response['data']
+    user_object = {
+      'email': response_data['mail'],
+      'first_name': response_data['firstname'],
+      'last_name': response_data['surname']
+    }
+    return await send_json(send, 200,
+                           await find_or_create_user_async(user_object))
+  if response.get('status_code') == '404':
+    return await send_json(send, 404, {'error': "Not found"})
+  try:
+    status = int(response.get('status_code'))
+  except (TypeError, ValueError):
+    status = 502
+  return await send_json(send, status, {'error': response.get('msg')})
+
+
+async def lifespan(receive, send):
+  """ Closes the async connection pools on shutdown """
+  while True:
+    message = await receive()
+    if message['type'] == 'lifespan.startup':
+      await send({'type': 'lifespan.startup.complete'})
+    elif message['type'] == 'lifespan.shutdown':
+      await ad_client.aclose()
+      if async_storage is not None:
+        await async_storage.close()
+      await send({'type': 'lifespan.shutdown.complete'})
+      return
+
+
+async def application(scope, receive, send):
+  """ ASGI application """
+  if scope['type'] == 'lifespan':
+    return await lifespan(receive, send)
+  if (scope['type'] == 'http' and scope['method'] == 'POST' and
+      scope['path'].rstrip('/') == '/api/v1/users'):
+    return await login(receive, send)
+  return await wsgi_application(scope, receive, send)
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+""" Concurrent delivery of reminder emails with retries """
+import asyncio
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Failure:
+  """ Recipient a message could not be delivered to """
+
+  def __init__(self, recipient, error, attempts):
+    """ Instantiate a Failure """
+    self.recipient = recipient
+    self.error = error
+    self.attempts = attempts
+
+
+class DeliveryResult:
+  """ Outcome of the delivery of one message. key is the value the
+  caller passed along with the message, e.g. a subscription id.
+  """
+
+  def __init__(self, key):
+    """ Instantiate an empty DeliveryResult """
+    self.key = key
+    self.accepted = []
+    self.failures = []
+
+
+def is_permanent(code):
+  """ Tells if an SMTP reply code is a permanent failure """
+  return code is not None and 500 <= code < 600
+
+
+async def deliver_message(loop, executor, semaphore, transport, key,
+                          message, recipients, max_attempts, retry_delay):
+  """ Sends a message, retrying the recipients that failed temporarily
+  with exponential backoff. Recipients that failed permanently, or
+  max_attempts times, are given up on and listed in the failures.
+  """
+  result = DeliveryResult(key)
+  pending = list(recipients)
+  attempt = 0
+  while pending:
+    attempt += 1
+    async with semaphore:
+      try:
+        refused = await loop.run_in_executor(
+          executor, transport.send, message, pending)
+      except smtplib.SMTPRecipientsRefused as err:
+        refused = err.recipients
+      except smtplib.SMTPResponseException as err:
+        refused = {recipient: (err.smtp_code, err.smtp_error)
+                   for recipient in pending}
+      except (smtplib.SMTPException, OSError) as err:
+        refused = {recipient: (None, str(err)) for recipient in pending}
+    retry = []
+    for recipient in pending:
+      if recipient not in refused:
+        result.accepted.append(recipient)
+        continue
+      code, reason = refused[recipient]
+      if is_permanent(code) or attempt >= max_attempts:
+        if isinstance(reason, bytes):
+          reason = reason.decode(errors="replace")
+        result.failures.append(Failure(
+          recipient, "{} {}".format(code or "", reason).strip()[:1024],
+          attempt))
+      else:
+        retry.append(recipient)
+    pending = retry
+    if pending:
+      await asyncio.sleep(retry_delay * 2 ** (attempt - 1))
+  return result
+
+
+async def deliver_all(transport, messages, concurrency, max_attempts,
+                      retry_delay):
+  """ Delivers (key, message, recipients) tuples with at most
+  concurrency messages in flight
+  """
+  loop = asyncio.get_running_loop()
+  semaphore = asyncio.Semaphore(concurrency)
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    return await asyncio.gather(*(
+      deliver_message(loop, executor, semaphore, transport, key, message,
+                      recipients, max_attempts, retry_delay)
+      for key, message, recipients in messages))
+
+
+def deliver(transport, messages, concurrency=8, max_attempts=4,
+            retry_delay=1):
+  """ Runs deliver_all to completion and returns its DeliveryResults """
+  return asyncio.run(deliver_all(transport, messages, concurrency,
+                                 max_attempts, retry_delay))
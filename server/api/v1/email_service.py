@@ -1,48 +1,310 @@
 #!/usr/bin/python3
-from celery import shared_task
+from celery import chord, shared_task
 from models import storage
+from models.dead_letter import DeadLetter
+from models.notification_run import NotificationRun, phases
+from api.v1.email_delivery import deliver
+from api.v1.email_transport import get_transport
+from email.message import EmailMessage
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from os import getenv
+from time import perf_counter, sleep
+import logging
+
+logger = logging.getLogger(__name__)
+
+# number of due subscriptions loaded and committed at a time
+batch_size = int(getenv("NOTIFICATION_BATCH_SIZE", 500))
+# number of due subscriptions handed to each send_email_chunk task
+chunk_size = int(getenv("NOTIFICATION_CHUNK_SIZE", 5000))
+# number of reminders being sent at the same time by a chunk
+concurrency = int(getenv("EMAIL_CONCURRENCY", 8))
+# attempts per recipient, and seconds before the first retry
+max_attempts = int(getenv("EMAIL_MAX_ATTEMPTS", 4))
+retry_delay = float(getenv("EMAIL_RETRY_DELAY", 1))
+# "subscription" sends one reminder per subscription to all its
+# stakeholders, "digest" one message per stakeholder listing all their
+# subscriptions due a reminder
+notification_mode = getenv("NOTIFICATION_MODE", "subscription")
+# seconds before reminders that could not be sent are due again
+retry_interval = float(getenv("NOTIFICATION_RETRY_INTERVAL", 3600))
+# longest sleep of run_scheduler, bounding how late it notices new
+# subscriptions
+scheduler_interval = float(getenv("NOTIFICATION_SCHEDULER_INTERVAL", 60))
+
+def new_stats():
+  """ Counts and phase times of a sweep, all zero """
+  stats = {"scanned": 0, "due": 0, "sent": 0, "failed": 0}
+  stats.update((phase + "_seconds", 0) for phase in phases)
+  return stats
+
+@contextmanager
+def timed(stats, phase):
+  """ Adds the time spent in the block to the phase time of stats """
+  start = perf_counter()
+  try:
+    yield
+  finally:
+    stats[phase + "_seconds"] += perf_counter() - start
+
+def record_run(started_at, stats):
+  """ Records a sweep run in a single process as a finished
+  NotificationRun
+  """
+  stats["failed"] = stats["due"] - stats["sent"]
+  run = NotificationRun(started_at=started_at, status="done", chunks=1)
+  run.add_chunk(stats)
+  run.finished_at = datetime.utcnow()
+  storage.new(run)
+  storage.save()
+  logger.info("Reminder sweep done: %s", NotificationRun.serializer.dump(run))
+  return run
 
 @shared_task(ignore_result=False)
 def send_email_task():
-  """ Task to handle email sending """
-  subscriptions = storage.all("Subscription")
+  """ Task coordinating a reminder sweep: records it as a
+  NotificationRun, splits the due subscriptions into id ranges and fans
+  them out to send_email_chunk tasks. In digest mode the sweep is done
+  by this task, and only recorded when reminders were due.
+  """
+  now = datetime.utcnow()
+  latest = storage.get_notification_runs(1)
+  if latest and latest[0].status == "running":
+    logger.warning("Reminder sweep %s started at %s is still running",
+                   latest[0].id, latest[0].started_at)
+  if notification_mode == "digest":
+    stats = new_stats()
+    send_digests(now, stats)
+    if not stats["scanned"]:
+      return {"run": None, "chunks": 0}
+    return {"run": record_run(now, stats).id, "chunks": 1}
+  run = NotificationRun(started_at=now, status="running")
+  start = perf_counter()
+  ranges = storage.get_due_id_ranges(now, chunk_size)
+  run.query_seconds = perf_counter() - start
+  run.chunks = len(ranges)
+  if not ranges:
+    run.status = "done"
+    run.finished_at = datetime.utcnow()
+  storage.new(run)
+  storage.save()
+  if ranges:
+    callback = summarize_email_chunks.s(run.id).on_error(
+      fail_notification_run.si(run.id))
+    chord(send_email_chunk.s(first_id, last_id, now.isoformat())
+          for first_id, last_id in ranges)(callback)
+  return {"run": run.id, "chunks": len(ranges)}
+
+@shared_task(ignore_result=False)
+def send_email_chunk(first_id, last_id, now):
+  """ Task sending the reminders due in an inclusive id range, returns
+  its counts and phase times
+  """
+  now = datetime.fromisoformat(now)
+  stats = new_stats()
+  batches = storage.get_due_subscriptions(now, batch_size, first_id,
+                                          last_id)
+  while True:
+    with timed(stats, "query"):
+      subscriptions = next(batches, None)
+    if subscriptions is None:
+      break
+    send_batch(subscriptions, now, stats)
+  stats["failed"] = stats["due"] - stats["sent"]
+  return stats
+
+@shared_task(ignore_result=False)
+def summarize_email_chunks(results, run_id):
+  """ Task adding up the counts reported by send_email_chunk tasks into
+  their NotificationRun
+  """
+  run = storage.get(NotificationRun, run_id)
+  for result in results:
+    run.add_chunk(result)
+  run.status = "done"
+  run.finished_at = datetime.utcnow()
+  storage.save()
+  summary = NotificationRun.serializer.dump(run)
+  logger.info("Reminder sweep done: %s", summary)
+  return summary
+
+@shared_task
+def fail_notification_run(run_id):
+  """ Task marking a NotificationRun failed when one of its chunks
+  failed
+  """
+  run = storage.get(NotificationRun, run_id)
+  run.status = "failed"
+  run.finished_at = datetime.utcnow()
+  storage.save()
+  logger.error("Reminder sweep %s failed", run_id)
+
+def send_batch(subscriptions, now, stats):
+  """ Sends the reminders of a batch of due subscriptions. Notified
+  subscriptions get their next reminder scheduled, the others are due
+  again after retry_interval seconds.
+  """
+  record_sent(subscriptions, set(send_emails(subscriptions, stats)), now,
+              stats)
+
+def record_sent(subscriptions, notified, now, stats):
+  """ Schedules the next reminder of the subscriptions whose ids are in
+  notified, and postpones the others by retry_interval seconds
+  """
+  with timed(stats, "commit"):
+    storage.record_notifications(
+      [subscription for subscription in subscriptions
+       if subscription.id in notified],
+      [subscription.id for subscription in subscriptions
+       if subscription.id not in notified],
+      now, now + timedelta(seconds=retry_interval))
+  stats["scanned"] += len(subscriptions)
+  stats["sent"] += len(notified)
+
+def send_earliest_due(now, stats):
+  """ Sends the reminders due at now, earliest first, batch_size at a
+  time
+  """
+  while True:
+    with timed(stats, "query"):
+      subscriptions = storage.get_earliest_due_subscriptions(now, batch_size)
+    if not subscriptions:
+      return
+    send_batch(subscriptions, now, stats)
+
+def run_scheduler():
+  """ Sends reminders as they fall due, earliest first, instead of
+  sweeping on a fixed schedule. Sleeps until the next reminder is due,
+  waking up at least every scheduler_interval seconds to pick up new
+  subscriptions. Every wake up with due reminders is recorded as a
+  NotificationRun.
+  """
+  while True:
+    now = datetime.utcnow()
+    stats = new_stats()
+    if notification_mode == "digest":
+      send_digests(now, stats)
+    else:
+      send_earliest_due(now, stats)
+    if stats["scanned"]:
+      record_run(now, stats)
+    next_at = storage.get_next_notification_at()
+    storage.close()
+    delay = scheduler_interval
+    if next_at is not None:
+      delay = min(delay, (next_at - datetime.utcnow()).total_seconds())
+    if delay > 0:
+      sleep(delay)
+
+def send_digests(now, stats):
+  """ Sends each stakeholder one message listing all their subscriptions
+  due a reminder. A subscription counts as notified once the message of
+  one of its stakeholders is accepted.
+  """
+  with timed(stats, "query"):
+    digests = storage.get_due_digests(now)
+  subscriptions = {}
+  # ids of the subscriptions listed in the digest of each stakeholder
+  digest_ids = {}
+  messages = []
+  with timed(stats, "render"):
+    for email, due in digests:
+      for subscription in due:
+        subscriptions[subscription.id] = subscription
+      if email is None:
+        logger.warning("%d subscriptions have no stakeholders", len(due))
+        continue
+      digest_ids[email] = [subscription.id for subscription in due]
+      messages.append((email, build_digest(email, due), [email]))
+  stats["due"] += len({subscription_id for ids in digest_ids.values()
+                       for subscription_id in ids})
+  with timed(stats, "send"):
+    results = deliver(get_transport(), messages, concurrency, max_attempts,
+                      retry_delay)
+  notified = set()
+  for result in results:
+    for failure in result.failures:
+      for subscription_id in digest_ids[result.key]:
+        add_dead_letter(subscription_id, failure)
+    if result.accepted:
+      notified.update(digest_ids[result.key])
+  record_sent(list(subscriptions.values()), notified, now, stats)
+  logger.info("%d digests sent for %d subscriptions", len(messages),
+              len(subscriptions))
+
+def build_digest(email, subscriptions):
+  """ Builds the message listing the subscriptions of a stakeholder that
+  are due a reminder, ordered by expiry date
+  """
+  today = datetime.utcnow()
+  message = EmailMessage()
+  message["From"] = getenv("EMAIL_SENDER", "no-reply@abujaelectricity.com")
+  message["To"] = email
+  if len(subscriptions) == 1:
+    message["Subject"] = "{} expires on {}".format(
+      subscriptions[0].subscription_name,
+      subscriptions[0].expiry_date.strftime("%d %B %Y"))
+  else:
+    message["Subject"] = "{} subscriptions expire soon".format(
+      len(subscriptions))
+  lines = ["The following subscriptions are about to expire:", ""]
   for subscription in subscriptions:
-    days_remaining = check_time_to_expiry_date(subscription.expiry_date)
-    if (days_remaining > 90):
-      days_passed = check_last_notification_date(subscription.last_notification)
-      if days_passed >= 30:
-        send_email(subscription)
-    elif (days_remaining <= 90 and days_remaining > 60):
-      days_passed = check_last_notification_date(subscription.last_notification)
-      if days_passed >= 7:
-        send_email(subscription)
-    elif (days_remaining <= 60 and days_remaining > 30):
-      days_passed = check_last_notification_date(subscription.last_notification)
-      if days_passed >= 3.5:
-        send_email(subscription)
-    elif (days_remaining <= 30):
-      days_passed = check_last_notification_date(subscription.last_notification)
-      if days_passed >= 1:
-        send_email(subscription)
-  
-
-def check_time_to_expiry_date(expiry_date):
-  """ Function to check how long to the expiry date
-  of a subscription
-  """
-  time_difference = expiry_date - datetime.utcnow()
-  days_remaining = time_difference.total_seconds() / 60
-  return days_remaining
-
-def check_last_notification_date(last_notification_date):
-  """ Function to check the last notification date of a subscription"""
-  if not last_notification_date:
-    return
-  time_difference = datetime.utcnow() - last_notification_date
-  days_passed = time_difference.total_seconds() / 60
-  return days_passed
-
-def send_email(subscription):
-  print("Email sent to Users")
-  setattr(subscription, "last_notification", datetime.utcnow())
+    lines.append("- {}: expires on {} ({} days from now)".format(
+      subscription.subscription_name,
+      subscription.expiry_date.strftime("%d %B %Y"),
+      (subscription.expiry_date - today).days))
+  lines.extend(["", "Please renew them before they run out."])
+  message.set_content("\n".join(lines) + "\n")
+  return message
+
+def build_message(subscription):
+  """ Builds the reminder sent to all stakeholders of a subscription """
+  days_remaining = (subscription.expiry_date - datetime.utcnow()).days
+  message = EmailMessage()
+  message["From"] = getenv("EMAIL_SENDER", "no-reply@abujaelectricity.com")
+  message["To"] = ", ".join(user.email for user in subscription.users)
+  message["Subject"] = "{} expires on {}".format(
+    subscription.subscription_name,
+    subscription.expiry_date.strftime("%d %B %Y"))
+  message.set_content(
+    "The subscription {} expires on {} ({} days from now).\n"
+    "Please renew it before it runs out.\n".format(
+      subscription.subscription_name,
+      subscription.expiry_date.strftime("%d %B %Y"), days_remaining))
+  return message
+
+def send_emails(subscriptions, stats=None):
+  """ Sends the reminders of subscriptions concurrently. Dead letters
+  are added to the session, to be committed with the batch. Returns the
+  ids of the subscriptions accepted for at least one stakeholder. The
+  reminders built and the render and send times are added to stats.
+  """
+  if stats is None:
+    stats = new_stats()
+  messages = []
+  with timed(stats, "render"):
+    for subscription in subscriptions:
+      if not subscription.users:
+        logger.warning("Subscription %s has no stakeholders",
+                       subscription.id)
+        continue
+      messages.append((subscription.id, build_message(subscription),
+                       [user.email for user in subscription.users]))
+  stats["due"] += len(messages)
+  with timed(stats, "send"):
+    results = deliver(get_transport(), messages, concurrency, max_attempts,
+                      retry_delay)
+  notified = []
+  for result in results:
+    for failure in result.failures:
+      add_dead_letter(result.key, failure)
+    if result.accepted:
+      notified.append(result.key)
+  return notified
+
+def add_dead_letter(subscription_id, failure):
+  """ Adds the DeadLetter of a delivery failure to the session """
+  storage.new(DeadLetter(subscription_id=subscription_id,
+                         recipient=failure.recipient, error=failure.error,
+                         attempts=failure.attempts))
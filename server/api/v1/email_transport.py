@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+""" Email transports used to deliver subscription reminders """
+import smtplib
+import threading
+from os import getenv
+from queue import Empty, LifoQueue
+
+
+class EmailTransport:
+  """ Base class of email transports """
+
+  def send(self, message, recipients=None):
+    """ Sends an email.message.EmailMessage to recipients, or to all of
+    its recipients when None. Returns a dict of the refused recipients.
+    """
+    raise NotImplementedError
+
+  def close(self):
+    """ Releases the resources held by the transport """
+
+
+class ConsoleTransport(EmailTransport):
+  """ Prints emails instead of sending them, for local development """
+
+  def send(self, message, recipients=None):
+    """ Prints the recipients and subject of an email """
+    print("Email to {}: {}".format(recipients or message["To"],
+                                   message["Subject"]))
+    return {}
+
+
+class MemoryTransport(EmailTransport):
+  """ Keeps sent emails in memory, for tests """
+
+  def __init__(self):
+    """ Instantiate a MemoryTransport with an empty outbox """
+    self.outbox = []
+    self.__lock = threading.Lock()
+
+  def send(self, message, recipients=None):
+    """ Appends an email and its recipients to the outbox """
+    with self.__lock:
+      self.outbox.append((message, recipients))
+    return {}
+
+
+class SMTPTransport(EmailTransport):
+  """ Sends emails over a pool of persistent, authenticated SMTP
+  connections shared by the threads of the process
+  """
+
+  def __init__(self, host, port=25, username=None, password=None,
+               use_tls=False, pool_size=4, timeout=30):
+    """ Instantiate an SMTPTransport, connections are opened on demand """
+    self.host = host
+    self.port = port
+    self.username = username
+    self.password = password
+    self.use_tls = use_tls
+    self.timeout = timeout
+    self.__idle = LifoQueue()
+    self.__slots = threading.BoundedSemaphore(pool_size)
+
+  def __connect(self):
+    """ Opens and authenticates a new SMTP connection """
+    connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+    if self.use_tls:
+      connection.starttls()
+    if self.username:
+      connection.login(self.username, self.password)
+    return connection
+
+  def __acquire(self):
+    """ Takes an idle connection from the pool or opens a new one """
+    self.__slots.acquire()
+    try:
+      return self.__idle.get_nowait()
+    except Empty:
+      pass
+    try:
+      return self.__connect()
+    except Exception:
+      self.__slots.release()
+      raise
+
+  def __release(self, connection):
+    """ Gives a connection back to the pool, or drops it when None """
+    if connection is not None:
+      self.__idle.put(connection)
+    self.__slots.release()
+
+  def send(self, message, recipients=None):
+    """ Sends an email on a pooled connection, reconnecting once if the
+    server closed it while idle
+    """
+    connection = self.__acquire()
+    try:
+      try:
+        refused = connection.send_message(message, to_addrs=recipients)
+      except smtplib.SMTPServerDisconnected:
+        connection.close()
+        connection = None
+        connection = self.__connect()
+        refused = connection.send_message(message, to_addrs=recipients)
+    except smtplib.SMTPRecipientsRefused:
+      self.__release(connection)
+      raise
+    except Exception:
+      if connection is not None:
+        quit_quietly(connection)
+      self.__release(None)
+      raise
+    self.__release(connection)
+    return refused
+
+  def close(self):
+    """ Closes every idle connection of the pool """
+    while True:
+      try:
+        quit_quietly(self.__idle.get_nowait())
+      except Empty:
+        return
+
+
+def quit_quietly(connection):
+  """ Closes an SMTP connection, ignoring errors """
+  try:
+    connection.quit()
+  except (smtplib.SMTPException, OSError):
+    connection.close()
+
+
+transports = {"console": ConsoleTransport, "memory": MemoryTransport}
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+  """ Gets the transport of the process, built once from EMAIL_BACKEND """
+  global _transport
+  with _transport_lock:
+    if _transport is None:
+      backend = getenv("EMAIL_BACKEND", "console")
+      if backend == "smtp":
+        _transport = SMTPTransport(
+          getenv("SMTP_HOST", "localhost"),
+          int(getenv("SMTP_PORT", 25)),
+          username=getenv("SMTP_USER"),
+          password=getenv("SMTP_PASSWORD"),
+          use_tls=getenv("SMTP_USE_TLS") == "1",
+          pool_size=int(getenv("SMTP_POOL_SIZE", 8)),
+          timeout=float(getenv("SMTP_TIMEOUT", 30)))
+      else:
+        _transport = transports[backend]()
+    return _transport
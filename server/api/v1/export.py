@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+""" Streaming NDJSON and CSV exports """
+import csv
+import io
+import json
+from datetime import datetime
+from flask import Response, stream_with_context
+
+# bytes buffered before a piece of the export is sent
+flush_size = 64 * 1024
+mimetypes = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def csv_value(value):
+  """ Formats a value for a CSV cell """
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if isinstance(value, list):
+    return " ".join(value)
+  return value
+
+
+def json_value(value):
+  """ Formats a value for JSON """
+  if isinstance(value, datetime):
+    return value.isoformat()
+  return value
+
+
+def generate(fields, rows, format):
+  """ Yields the export of rows of values, in the order of fields, in
+  pieces of about flush_size characters
+  """
+  buffer = io.StringIO()
+  if format == 'csv':
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+  for row in rows:
+    if format == 'csv':
+      writer.writerow([csv_value(value) for value in row])
+    else:
+      buffer.write(json.dumps(
+        {field: json_value(value) for field, value in zip(fields, row)}))
+      buffer.write("\n")
+    if buffer.tell() >= flush_size:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  yield buffer.getvalue()
+
+
+def export_response(fields, rows, format, name):
+  """ Makes a streamed response exporting rows as NDJSON or CSV """
+  response = Response(stream_with_context(generate(fields, rows, format)),
+                      mimetype=mimetypes[format])
+  response.headers['Content-Disposition'] = \
+    'attachment; filename={}.{}'.format(name, format)
+  return response
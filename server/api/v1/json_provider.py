@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+""" orjson backed JSON provider, used when orjson is installed """
+from flask.json.provider import DefaultJSONProvider
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+  """ Serializes JSON with orjson. The output decodes to the same values
+  as the default provider's, with one difference in the text: orjson
+  writes non-ASCII characters as UTF-8 instead of \\uXXXX escapes, as
+  if ensure_ascii were False.
+  """
+  ensure_ascii = False
+
+  def dumps(self, obj, **kwargs):
+    """ Serializes obj to a JSON string """
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if kwargs.get("sort_keys", self.sort_keys):
+      option |= orjson.OPT_SORT_KEYS
+    if kwargs.get("indent"):
+      option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=self.default, option=option).decode()
+
+  def loads(self, s, **kwargs):
+    """ Deserializes a JSON string or bytes """
+    return orjson.loads(s)
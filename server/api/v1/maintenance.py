@@ -0,0 +1,16 @@
+#!/usr/bin/python3
+""" Periodic upkeep tasks """
+from celery import shared_task
+from models import storage
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def rebuild_subscription_summary():
+  """ Task moving the subscription summary to today's expiry buckets,
+  run daily by Celery beat
+  """
+  rows = storage.rebuild_subscription_summary()
+  logger.info("Subscription summary rebuilt: %d rows", rows)
+  return rows
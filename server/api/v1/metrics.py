@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+""" Per endpoint request latency and SQL statement metrics, rendered in
+the Prometheus text format. Request metrics are kept with
+prometheus_client, shared by the workers of a gunicorn server through
+PROMETHEUS_MULTIPROC_DIR. The reminder sweep metrics are read from the
+notification_runs table.
+"""
+import logging
+import threading
+import time
+from os import getenv
+from flask import request
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter,
+                               Histogram, disable_created_metrics,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models.notification_run import phases
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency histogram buckets, in seconds
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# upper bounds of the SQL statements per request histogram buckets
+query_buckets = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# requests running more SQL statements are logged and counted
+query_threshold = int(getenv("SQL_QUERY_THRESHOLD", 50))
+label_names = ("endpoint", "method", "status")
+
+# the _created samples cannot be added up across processes
+disable_created_metrics()
+
+
+class Metrics:
+  """ Request metrics grouped by endpoint, method and status. When
+  PROMETHEUS_MULTIPROC_DIR is set, every process of the server writes
+  its samples to files in that directory, and render() adds up the
+  samples of all of them.
+  """
+
+  def __init__(self, registry=REGISTRY):
+    """ Instantiate the metrics, registered in registry """
+    self.registry = registry
+    self.__latency = Histogram(
+      "http_request_duration_seconds", "Request latency", label_names,
+      buckets=latency_buckets, registry=registry)
+    self.__queries = Histogram(
+      "http_request_sql_queries", "SQL statements run per request",
+      label_names, buckets=query_buckets, registry=registry)
+    self.__query_seconds = Counter(
+      "http_request_sql_seconds", "Time spent in SQL statements",
+      label_names, registry=registry)
+    self.__over_threshold = Counter(
+      "http_requests_over_query_threshold",
+      "Requests running more than {} SQL statements".format(
+        query_threshold), label_names, registry=registry)
+
+  def record(self, labels, seconds, queries, query_seconds):
+    """ Records a finished request """
+    self.__latency.labels(*labels).observe(seconds)
+    self.__queries.labels(*labels).observe(queries)
+    self.__query_seconds.labels(*labels).inc(query_seconds)
+    if queries > query_threshold:
+      self.__over_threshold.labels(*labels).inc()
+
+  def render(self):
+    """ Gets the metrics in the Prometheus text format """
+    registry = self.registry
+    if getenv("PROMETHEUS_MULTIPROC_DIR"):
+      registry = CollectorRegistry()
+      multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry).decode()
+
+
+def render_notification_runs(totals):
+  """ Gets the reminder sweep totals of get_notification_run_totals in
+  the Prometheus text format
+  """
+  lines = ["# HELP notification_runs_total Reminder sweeps by status",
+           "# TYPE notification_runs_total counter"]
+  for status, count in sorted(totals["runs"].items()):
+    lines.append('notification_runs_total{{status="{}"}} {}'.format(status,
+                                                                    count))
+  lines.extend([
+    "# HELP notification_subscriptions_total Subscriptions handled by "
+    "reminder sweeps",
+    "# TYPE notification_subscriptions_total counter"])
+  for outcome in ("scanned", "due", "sent", "failed"):
+    lines.append('notification_subscriptions_total{{outcome="{}"}} {}'
+                 .format(outcome, totals[outcome]))
+  lines.extend([
+    "# HELP notification_phase_seconds_total Time reminder sweeps spent "
+    "in each phase",
+    "# TYPE notification_phase_seconds_total counter"])
+  for phase in phases:
+    lines.append('notification_phase_seconds_total{{phase="{}"}} {}'
+                 .format(phase, round(totals[phase + "_seconds"], 6)))
+  lines.extend([
+    "# HELP notification_last_run_duration_seconds Wall time of the last "
+    "finished reminder sweep",
+    "# TYPE notification_last_run_duration_seconds gauge"])
+  if totals["last_duration"] is not None:
+    lines.append("notification_last_run_duration_seconds {}".format(
+      round(totals["last_duration"], 6)))
+  return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+# SQL statements of the request handled by the current thread
+current = threading.local()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query(conn, cursor, statement, parameters, context, executemany):
+  """ Notes when a statement starts """
+  conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_query(conn, cursor, statement, parameters, context, executemany):
+  """ Adds a finished statement to the current request """
+  started = conn.info["query_start"].pop()
+  if getattr(current, "active", False):
+    current.queries += 1
+    current.query_seconds += time.perf_counter() - started
+
+
+def start_request():
+  """ Starts measuring a request """
+  current.active = True
+  current.queries = 0
+  current.query_seconds = 0
+  current.started = time.perf_counter()
+
+
+def end_request(response):
+  """ Records the metrics of a request """
+  if not getattr(current, "active", False):
+    return response
+  current.active = False
+  seconds = time.perf_counter() - current.started
+  endpoint = request.endpoint or "unknown"
+  metrics.record((endpoint, request.method, response.status_code), seconds,
+                 current.queries, current.query_seconds)
+  if current.queries > query_threshold:
+    logger.warning("%s %s ran %d SQL statements (threshold %d)",
+                   request.method, request.path, current.queries,
+                   query_threshold)
+  return response
+
+
+def init_metrics(app):
+  """ Measures every request of a Flask app """
+  app.before_request(start_request)
+  app.after_request(end_request)
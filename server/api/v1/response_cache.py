@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+""" Server side cache of API responses, invalidated when writes commit """
+import json
+import logging
+import threading
+from functools import wraps
+from os import getenv
+from flask import make_response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models import storage
+from models.engine.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# cache namespaces whose responses depend on each table
+table_namespaces = {
+  "subscriptions": ("subscriptions",),
+  "user_subscriptions": ("subscriptions",),
+  "users": ("users", "subscriptions"),
+}
+# response headers stored along with the body
+kept_headers = ("Content-Type", "X-Next-Cursor")
+
+
+class MemoryBackend:
+  """ Cache held in the memory of the process """
+
+  def __init__(self, maxsize, ttl):
+    """ Instantiate a MemoryBackend """
+    self.__entries = TTLCache(maxsize, ttl)
+    self.__generations = {}
+    self.__lock = threading.Lock()
+
+  def generation(self, namespace):
+    """ Gets the current generation of a namespace """
+    return self.__generations.get(namespace, 0)
+
+  def invalidate(self, namespace):
+    """ Moves a namespace to a new generation """
+    with self.__lock:
+      self.__generations[namespace] = self.generation(namespace) + 1
+
+  def get(self, key):
+    """ Gets a cached value """
+    return self.__entries.get(key)
+
+  def set(self, key, value):
+    """ Caches a value """
+    self.__entries.set(key, value)
+
+  def evictions(self):
+    """ Gets the number of entries evicted to make room """
+    return self.__entries.evictions
+
+
+class RedisBackend:
+  """ Cache shared by every process through Redis """
+  prefix = "response_cache:"
+
+  def __init__(self, url, ttl):
+    """ Instantiate a RedisBackend """
+    import redis
+    self.__redis = redis.Redis.from_url(url)
+    self.ttl = ttl
+
+  def generation(self, namespace):
+    """ Gets the current generation of a namespace """
+    return int(self.__redis.get(self.prefix + "generation:" + namespace) or 0)
+
+  def invalidate(self, namespace):
+    """ Moves a namespace to a new generation """
+    self.__redis.incr(self.prefix + "generation:" + namespace)
+
+  def get(self, key):
+    """ Gets a cached value """
+    value = self.__redis.get(self.prefix + key)
+    return value.decode() if value is not None else None
+
+  def set(self, key, value):
+    """ Caches a value """
+    self.__redis.setex(self.prefix + key, int(self.ttl), value)
+
+  def evictions(self):
+    """ Gets the number of keys Redis evicted to make room """
+    return self.__redis.info("stats").get("evicted_keys", 0)
+
+
+class ResponseCache:
+  """ Caches the 200 responses of GET views by request path and by the
+  database their reads go to. Requests asking to read their own writes
+  with an X-Read-Your-Writes header bypass the cache.
+  """
+
+  def __init__(self, backend=None):
+    """ Instantiate a ResponseCache, disabled when backend is None """
+    self.backend = backend
+    self.hits = 0
+    self.misses = 0
+    self.errors = 0
+
+  def cached(self, *namespaces):
+    """ Decorates a view whose response depends on namespaces """
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        if (self.backend is None or
+            request.headers.get("X-Read-Your-Writes")):
+          return view(*args, **kwargs)
+        try:
+          generations = [self.backend.generation(namespace)
+                         for namespace in namespaces]
+          target = "replica" if storage.reads_replica() else "primary"
+          key = "{}:{}:{}".format(target, ":".join(map(str, generations)),
+                                  request.full_path)
+          value = self.backend.get(key)
+        except Exception:
+          self.errors += 1
+          logger.exception("Response cache lookup failed")
+          return view(*args, **kwargs)
+        if value is not None:
+          self.hits += 1
+          value = json.loads(value)
+          return make_response(value["body"], 200, value["headers"])
+        self.misses += 1
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+          headers = [(name, response.headers[name]) for name in kept_headers
+                     if name in response.headers]
+          value = json.dumps({"body": response.get_data(as_text=True),
+                              "headers": headers})
+          try:
+            self.backend.set(key, value)
+          except Exception:
+            self.errors += 1
+            logger.exception("Response cache store failed")
+        return response
+      return wrapper
+    return decorator
+
+  def invalidate(self, namespaces):
+    """ Drops every cached response of namespaces """
+    for namespace in namespaces:
+      try:
+        self.backend.invalidate(namespace)
+      except Exception:
+        self.errors += 1
+        logger.exception("Response cache invalidation failed")
+
+  def stats(self):
+    """ Gets the hit, miss and eviction counters """
+    if self.backend is None:
+      return {"enabled": False}
+    try:
+      evictions = self.backend.evictions()
+    except Exception:
+      evictions = None
+    return {"enabled": True, "hits": self.hits, "misses": self.misses,
+            "evictions": evictions, "errors": self.errors}
+
+
+def make_backend():
+  """ Builds the backend set by RESPONSE_CACHE: off, memory or a
+  redis:// URL. The memory backend is only invalidated by the writes of
+  its own process, so it is refused when a Celery worker writes too.
+  """
+  setting = getenv("RESPONSE_CACHE", "off")
+  ttl = float(getenv("RESPONSE_CACHE_TTL", 60))
+  if setting == "memory":
+    if (getenv("ENABLE_CELERY", "1") == "1" and
+        getenv("CELERY_ALWAYS_EAGER") != "1"):
+      raise ValueError("RESPONSE_CACHE=memory would serve stale responses "
+                       "after the Celery worker writes, use a redis:// URL "
+                       "or ENABLE_CELERY=0")
+    return MemoryBackend(int(getenv("RESPONSE_CACHE_SIZE", 1024)), ttl)
+  if setting.startswith("redis"):
+    return RedisBackend(setting, ttl)
+  return None
+
+
+response_cache = ResponseCache(make_backend())
+cached = response_cache.cached
+# namespaces written by the current thread's uncommitted transaction
+pending = threading.local()
+
+
+@event.listens_for(Engine, "after_execute")
+def record_write(conn, clauseelement, *args):
+  """ Notes the namespaces an INSERT, UPDATE or DELETE affects """
+  if response_cache.backend is None or not getattr(clauseelement, "is_dml",
+                                                   False):
+    return
+  namespaces = table_namespaces.get(clauseelement.table.name, ())
+  if namespaces:
+    if not hasattr(pending, "namespaces"):
+      pending.namespaces = set()
+    pending.namespaces.update(namespaces)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_written(session):
+  """ Invalidates the namespaces written by a committed transaction """
+  namespaces = getattr(pending, "namespaces", None)
+  if namespaces:
+    pending.namespaces = set()
+    response_cache.invalidate(namespaces)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_written(session):
+  """ Forgets the writes of a rolled back transaction """
+  pending.namespaces = set()
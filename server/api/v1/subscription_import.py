@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+""" Bulk import of subscriptions from CSV or NDJSON streams """
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from os import getenv
+from models import storage
+from sqlalchemy.exc import SQLAlchemyError
+
+# number of rows validated, resolved and inserted together
+chunk_size = int(getenv("IMPORT_CHUNK_SIZE", 1000))
+# number of row errors kept for the response
+max_errors = 1000
+required = ['subscription_name', 'start_date', 'expiry_date', 'users']
+
+
+class ImportReport:
+  """ Counts imported rows and keeps the first row errors """
+
+  def __init__(self):
+    """ Instantiate an empty ImportReport """
+    self.imported = 0
+    self.error_count = 0
+    self.errors = []
+
+  def add_error(self, error):
+    """ Records a row error """
+    self.error_count += 1
+    if len(self.errors) < max_errors:
+      self.errors.append(error)
+
+  def to_dict(self):
+    """ Returns a dictionary representation of the report """
+    return {'imported': self.imported, 'error_count': self.error_count,
+            'errors': self.errors}
+
+
+def read_rows(stream, format):
+  """ Yields (row number, row dict or error) from a binary stream of
+  UTF-8 CSV with a header line, or of JSON objects one per line. A byte
+  order mark, as Excel writes, is skipped. Reading stops with an error
+  at a row that is not valid UTF-8 or not valid CSV.
+  """
+  text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+  number = 0
+  try:
+    if format == 'csv':
+      for number, row in enumerate(csv.DictReader(text), start=1):
+        yield number, row
+      return
+    for number, line in enumerate(text, start=1):
+      if not line.strip():
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError:
+        yield number, "Invalid JSON"
+        continue
+      if not isinstance(row, dict):
+        yield number, "Row is not a JSON object"
+        continue
+      yield number, row
+  except UnicodeDecodeError:
+    yield number + 1, "Not valid UTF-8, the rest of the file was not read"
+  except csv.Error as err:
+    yield number + 1, ("Invalid CSV ({}), the rest of the file was not "
+                       "read".format(err))
+
+
+def parse_date(value):
+  """ Parses an ISO formatted date """
+  if isinstance(value, str):
+    return datetime.fromisoformat(value.strip())
+  raise ValueError
+
+
+def parse_status(value):
+  """ Parses an optional subscription status, active by default """
+  if value is None or value == '':
+    return True
+  if isinstance(value, bool):
+    return value
+  value = str(value).strip().lower()
+  if value in ('1', 'true', 'active', 'yes'):
+    return True
+  if value in ('0', 'false', 'inactive', 'no'):
+    return False
+  raise ValueError
+
+
+def validate_row(row):
+  """ Checks a row, returns its subscription mapping and stakeholder
+  emails, or raises ValueError with the reason
+  """
+  for key in required:
+    if not row.get(key):
+      raise ValueError("Missing {}".format(key))
+  try:
+    start_date = parse_date(row['start_date'])
+  except ValueError:
+    raise ValueError("Invalid start_date")
+  try:
+    expiry_date = parse_date(row['expiry_date'])
+  except ValueError:
+    raise ValueError("Invalid expiry_date")
+  try:
+    status = parse_status(row.get('subscription_status'))
+  except ValueError:
+    raise ValueError("Invalid subscription_status")
+  users = row['users']
+  emails = users.split() if isinstance(users, str) else users
+  if not isinstance(emails, list) or not all(
+      isinstance(email, str) for email in emails):
+    raise ValueError("Invalid users")
+  name = str(row['subscription_name'])
+  if len(name) > 1024:
+    raise ValueError("subscription_name is too long")
+  subscription = {'subscription_name': name,
+                  'subscription_status': status,
+                  'start_date': start_date,
+                  'expiry_date': expiry_date}
+  return subscription, list(dict.fromkeys(emails))
+
+
+def insert_chunk(creator, chunk, report):
+  """ Resolves the stakeholders of validated rows with one query and
+  inserts the rows in one transaction. Returns the number inserted.
+  """
+  emails = list({email for _, _, row_emails in chunk
+                 for email in row_emails})
+  users = dict(zip(emails, storage.get_users_by_emails(emails)))
+  now = datetime.now()
+  subscriptions = []
+  links = []
+  for number, subscription, row_emails in chunk:
+    unknown = [email for email in row_emails if users[email] is None]
+    if unknown:
+      report.add_error({'row': number,
+                        'error': "Unknown stakeholder emails: {}".format(
+                          " ".join(unknown))})
+      continue
+    subscription.update(id=str(uuid.uuid4()), created_at=now,
+                        updated_at=now, created_by=creator.id,
+                        last_notification=None)
+    subscriptions.append(subscription)
+    for email in row_emails:
+      links.append({'user_id': users[email].id,
+                    'subscription_id': subscription['id']})
+  if not subscriptions:
+    return 0
+  try:
+    storage.bulk_insert_subscriptions(subscriptions, links)
+  except SQLAlchemyError as err:
+    first, last = chunk[0][0], chunk[-1][0]
+    report.add_error({'rows': [first, last], 'error': "Insert failed: {}"
+                      .format(err.__class__.__name__)})
+    return 0
+  return len(subscriptions)
+
+
+def import_subscriptions(creator, stream, format):
+  """ Imports the subscriptions of a stream chunk by chunk, returns an
+  ImportReport
+  """
+  report = ImportReport()
+  chunk = []
+  for number, row in read_rows(stream, format):
+    if isinstance(row, str):
+      report.add_error({'row': number, 'error': row})
+      continue
+    try:
+      subscription, emails = validate_row(row)
+    except ValueError as err:
+      report.add_error({'row': number, 'error': str(err)})
+      continue
+    chunk.append((number, subscription, emails))
+    if len(chunk) == chunk_size:
+      report.imported += insert_chunk(creator, chunk, report)
+      chunk = []
+  if chunk:
+    report.imported += insert_chunk(creator, chunk, report)
+  return report
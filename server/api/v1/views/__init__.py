@@ -1,9 +1,63 @@
 #!/usr/bin/python3
 """ Blueprint for API """
-from flask import Blueprint
+from flask import Blueprint, make_response, request
+from functools import wraps
+from hashlib import sha1
+from datetime import timezone
+from models import storage
 
 app_views = Blueprint('app_views', __name__, url_prefix='/api/v1')
 
+@app_views.before_request
+def route_reads():
+  """ Sends the queries of GET requests to the read replica, unless the
+  client asks to read its own writes with an X-Read-Your-Writes header
+  """
+  if request.method == 'GET' and not request.headers.get('X-Read-Your-Writes'):
+    storage.use_replica()
+
+def conditional(fingerprint):
+  """ Makes a GET view answer 304 Not Modified when the client already
+  has the current version. fingerprint is called with the view's
+  arguments and returns a (version, last modified datetime) pair, or
+  None to skip the check. The strong ETag is derived from the version
+  and the full request path. Lists give no last modified datetime: the
+  latest updated_at of their rows does not change when one is deleted,
+  so If-Modified-Since could not tell.
+  """
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      state = fingerprint(*args, **kwargs)
+      if state is None:
+        return view(*args, **kwargs)
+      version, last_modified = state
+      etag = sha1("{}|{}".format(request.full_path, version).encode())
+      etag = etag.hexdigest()
+      if last_modified is not None:
+        # updated_at is stored in the server's local time
+        last_modified = last_modified.replace(microsecond=0).astimezone(
+          timezone.utc)
+      if request.if_none_match:
+        # proxies compressing the response weaken the ETag they pass on
+        not_modified = request.if_none_match.contains_weak(etag)
+      else:
+        not_modified = (last_modified is not None and
+                        request.if_modified_since is not None and
+                        last_modified <= request.if_modified_since)
+      if not_modified:
+        response = make_response('', 304)
+      else:
+        response = make_response(view(*args, **kwargs))
+      response.set_etag(etag)
+      if last_modified is not None:
+        response.last_modified = last_modified
+      response.headers['Cache-Control'] = 'no-cache'
+      return response
+    return wrapper
+  return decorator
+
 from api.v1.views.index import *
 from api.v1.views.users import *
-from api.v1.views.subscriptions import *
\ No newline at end of file
+from api.v1.views.subscriptions import *
+from api.v1.views.notification_runs import *
\ No newline at end of file
@@ -4,8 +4,13 @@ from models.subscription import Subscription
 from models.user import User
 from models import storage
 from api.v1.views import app_views
-from flask import jsonify
-from ..email_service import send_email_task
+from flask import Response, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from ..response_cache import response_cache
+from ..metrics import metrics, render_notification_runs
+import logging
+
+logger = logging.getLogger(__name__)
 
 @app_views.route('/')
 def begin():
@@ -14,6 +19,38 @@ def begin():
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
 def status():
-  """ Status of API """
-  return jsonify({"status": "OK"})
-  
\ No newline at end of file
+  """ Status of API, of its database connection pool and response cache
+  ---
+  responses:
+    200:
+      description: API and database are up
+    503:
+      description: The database could not be reached
+  """
+  database = {"pool": storage.pool_status()}
+  cache = response_cache.stats()
+  try:
+    database["ping_ms"] = round(storage.ping(), 3)
+  except SQLAlchemyError as err:
+    database["error"] = str(err.__class__.__name__)
+    return jsonify({"status": "ERROR", "database": database,
+                    "cache": cache}), 503
+  return jsonify({"status": "OK", "database": database, "cache": cache})
+  
+
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def get_metrics():
+  """ Request latency and SQL statement metrics of all the workers
+  sharing PROMETHEUS_MULTIPROC_DIR, or of this process without it, and
+  reminder sweep totals, in the Prometheus text format
+  ---
+  responses:
+    200:
+      description: The metrics
+  """
+  body = metrics.render()
+  try:
+    body += render_notification_runs(storage.get_notification_run_totals())
+  except SQLAlchemyError:
+    logger.exception("Could not read the reminder sweep totals")
+  return Response(body, mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+""" Reminder sweep API endpoints """
+from models.notification_run import NotificationRun
+from models import storage
+from api.v1.views import app_views
+from api.v1.views.pagination import get_limit
+from flask import abort, jsonify
+
+@app_views.route('/notification_runs', methods=['GET'], strict_slashes=False)
+def get_notification_runs():
+  """ Gets the latest reminder sweeps, most recent first
+  ---
+  parameters:
+    - name: limit
+      in: query
+      type: integer
+      description: Number of sweeps to return, 100 by default
+  responses:
+    200:
+      description: The sweeps with their counts and phase times
+  """
+  runs = storage.get_notification_runs(get_limit())
+  return jsonify([NotificationRun.serializer.dump(run) for run in runs])
+
+@app_views.route('/notification_runs/<run_id>', methods=['GET'],
+                 strict_slashes=False)
+def get_notification_run(run_id):
+  """ Gets a reminder sweep
+  ---
+  responses:
+    200:
+      description: The sweep with its counts and phase times
+    404:
+      description: Sweep not found
+  """
+  run = storage.get(NotificationRun, run_id)
+  if run is None:
+    abort(404)
+  return jsonify(NotificationRun.serializer.dump(run))
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+""" Pagination helpers shared by the list endpoints """
+from flask import abort, request
+from datetime import datetime
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def get_limit():
+  """ Reads the page size from the query string """
+  try:
+    limit = int(request.args.get('limit', DEFAULT_LIMIT))
+  except ValueError:
+    abort(400, description="Invalid limit")
+  if limit < 1:
+    abort(400, description="Invalid limit")
+  return min(limit, MAX_LIMIT)
+
+
+def get_date_arg(name):
+  """ Reads an ISO formatted date from the query string """
+  value = request.args.get(name)
+  if value is None:
+    return None
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    abort(400, description="Invalid {}".format(name))
+
+
+def get_status_arg():
+  """ Reads the subscription status filter from the query string """
+  value = request.args.get('status')
+  if value is None:
+    return None
+  if value not in ('active', 'inactive'):
+    abort(400, description="Invalid status")
+  return value == 'active'
+
+
+def paginated_response(body, next_cursor):
+  """ Adds the next page cursor to a list response """
+  headers = {}
+  if next_cursor:
+    headers['X-Next-Cursor'] = next_cursor
+  return body, 200, headers
+
+
+def get_role_arg():
+  """ Reads the role filter of a user's subscriptions from the query
+  string
+  """
+  value = request.args.get('role')
+  if value is not None and value not in ('creator', 'stakeholder'):
+    abort(400, description="Invalid role")
+  return value
@@ -1,31 +1,174 @@
 #!/usr/bin/python3
 """ Subscription API endpoints """
 from models.subscription import Subscription
+from models.subscription_summary import summarize
 from models.user import User
 from models import storage
-from api.v1.views import app_views
+from api.v1.views import app_views, conditional
+from api.v1.response_cache import cached
+from api.v1.export import export_response, mimetypes
+from api.v1.subscription_import import import_subscriptions
+from api.v1.views.pagination import (get_date_arg, get_limit,
+                                     get_status_arg, paginated_response)
 from flask import abort, jsonify, make_response, request
 from datetime import datetime
 
+def subscriptions_fingerprint():
+  """ Version of the subscriptions matching the request filters """
+  count, updated_at, links = storage.get_fingerprint(
+    Subscription, status=get_status_arg(),
+    expires_after=get_date_arg('expires_after'),
+    expires_before=get_date_arg('expires_before'))
+  return "{}|{}|{}".format(count, updated_at, links), None
+
+def subscription_fingerprint(subscription_id):
+  """ Version of a subscription """
+  updated_at = storage.get_updated_at(Subscription, subscription_id)
+  if updated_at is None:
+    return None
+  return updated_at.isoformat(), updated_at
+
 @app_views.route('/subscriptions', methods=['GET'],
                  strict_slashes=False)
+@conditional(subscriptions_fingerprint)
+@cached('subscriptions')
 def get_subscriptions():
-  """Retrieves a list of all subscriptions
+  """Retrieves a page of subscriptions ordered by expiry date
+  ---
+  tags: S
+  parameters:
+    - name: limit
+      in: query
+      type: integer
+      description: Number of subscriptions per page (default 100, max 1000)
+    - name: cursor
+      in: query
+      type: string
+      description: The X-Next-Cursor header of the previous page
+    - name: status
+      in: query
+      type: string
+      enum: [active, inactive]
+    - name: expires_after
+      in: query
+      type: string
+      description: ISO date, only subscriptions expiring on or after it
+    - name: expires_before
+      in: query
+      type: string
+      description: ISO date, only subscriptions expiring before it
+  responses:
+    200:
+      description: Subscriptions gotten successfully
+    304:
+      description: The client's copy, from If-None-Match, is current
+    400:
+      description: Invalid pagination or filter parameters
+  """
+  try:
+    serializer = Subscription.dashboard_serializer
+    rows, next_cursor = storage.paginate(
+      Subscription, serializer.fields, get_limit(),
+      cursor=request.args.get('cursor'), status=get_status_arg(),
+      expires_after=get_date_arg('expires_after'),
+      expires_before=get_date_arg('expires_before'))
+  except ValueError as err:
+    abort(400, description=str(err))
+  list_subscriptions = [serializer.dump_row(row) for row in rows]
+  return paginated_response(jsonify(list_subscriptions), next_cursor)
+
+@app_views.route('/subscriptions/search', methods=['GET'],
+                 strict_slashes=False)
+@cached('subscriptions')
+def search_subscriptions():
+  """ Finds the subscriptions whose name or a stakeholder email contains
+  the search text, best matches first
+  ---
+  tags: S
+  parameters:
+    - name: q
+      in: query
+      type: string
+      required: true
+      description: Text to find, at least 3 characters, case insensitive
+    - name: limit
+      in: query
+      type: integer
+      description: Number of subscriptions per page (default 100, max 1000)
+    - name: cursor
+      in: query
+      type: string
+      description: The X-Next-Cursor header of the previous page
+  responses:
+    200:
+      description: Matching subscriptions, exact name matches first, then
+        name prefixes, name substrings and stakeholder emails
+    400:
+      description: Missing or too short search text, or invalid paging
+  """
+  text = request.args.get('q', '').strip()
+  if len(text) < 3:
+    abort(400, description="Search text needs at least 3 characters")
+  try:
+    offset = int(request.args.get('cursor', 0))
+  except ValueError:
+    abort(400, description="Invalid cursor")
+  if offset < 0:
+    abort(400, description="Invalid cursor")
+  serializer = Subscription.listing_serializer
+  rows, next_offset = storage.search_subscriptions(
+    text, serializer.fields, get_limit(), offset)
+  return paginated_response(
+    jsonify([serializer.dump_row(row) for row in rows]),
+    str(next_offset) if next_offset is not None else None)
+
+@app_views.route('/subscriptions/summary', methods=['GET'],
+                 strict_slashes=False)
+def get_subscriptions_summary():
+  """ Counts of subscriptions by status, expiry bucket and creator, read
+  from the incrementally maintained subscription_summary table
   ---
   tags: S
   responses:
     200:
-      description: All subscriptions gotten successfully
+      description: The counts. Expiry buckets are relative to as_of, the
+        date the summary was last rebuilt on
   """
-  all_subscriptions = storage.all(Subscription).values()
-  # print(all_subscriptions)
-  list_subscriptions = []
-  for subscription in all_subscriptions:
-    list_subscriptions.append(subscription.make_dashboard_response())
-  return (jsonify(list_subscriptions)), 200
+  return jsonify(summarize(storage.get_subscription_summary()))
+
+@app_views.route('/subscriptions/export', methods=['GET'],
+                 strict_slashes=False)
+def export_subscriptions():
+  """ Streams every subscription with its stakeholder emails
+  ---
+  tags: S
+  produces:
+    - application/x-ndjson
+    - text/csv
+  parameters:
+    - name: format
+      in: query
+      type: string
+      enum: [ndjson, csv]
+      description: Export format, ndjson by default
+  responses:
+    200:
+      description: Subscriptions export
+    400:
+      description: Unknown export format
+  """
+  format = request.args.get('format', 'ndjson')
+  if format not in mimetypes:
+    abort(400, description="Format must be ndjson or csv")
+  fields = ['id', 'subscription_name', 'subscription_status', 'start_date',
+            'expiry_date', 'last_notification', 'created_by', 'users']
+  return export_response(fields, storage.stream_subscriptions(), format,
+                         'subscriptions')
 
 @app_views.route('/subscriptions/<subscription_id>', methods=['GET'],
                  strict_slashes=False)
+@conditional(subscription_fingerprint)
+@cached('subscriptions')
 def get_subscription(subscription_id):
   """ Gets a subscription by ID
   ---
@@ -39,13 +182,15 @@ def get_subscription(subscription_id):
   responses:
     200:
       description: Subscription information gotten successfully
+    304:
+      description: The client's copy, from If-None-Match or If-Modified-Since, is current
     404:
       description: Subscription not found
   """
   subscription = storage.get(Subscription, subscription_id)
   if not subscription:
     abort(404)
-  return jsonify(subscription.to_dict()), 200
+  return jsonify(Subscription.serializer.dump(subscription)), 200
 
 @app_views.route('/subscription/<subscription_id>', methods=['DELETE'],
                  strict_slashes=False)
@@ -104,7 +249,8 @@ def create_subscription(user_id):
     201:
       description: Subscription created successfully
     400:
-      description: Invalid JSON or missing parameters
+      description: Invalid JSON, missing parameters or unknown
+        stakeholder emails
 
   """
   if not request.get_json():
@@ -122,11 +268,66 @@ def create_subscription(user_id):
   request_data = request.get_json()
   subscription_creator = storage.get(User, user_id)
   # print(type(subscription_creator))
-  new_subscription = Subscription(subscription_creator, **request_data)
+  try:
+    new_subscription = Subscription(subscription_creator, **request_data)
+  except ValueError as err:
+    abort(400, description=str(err))
   # print(type(new_subscription))
   new_subscription.save()
-  print(new_subscription.to_dict())
-  return make_response(jsonify(new_subscription.to_dict()), 201)
+  return make_response(
+    jsonify(Subscription.serializer.dump(new_subscription)), 201)
+
+@app_views.route('/subscriptions/<user_id>/import', methods=['POST'],
+                 strict_slashes=False)
+def import_subscriptions_in_bulk(user_id):
+  """ Imports subscriptions in bulk from a CSV or NDJSON upload
+  ---
+  tags: S
+  consumes:
+    - text/csv
+    - application/x-ndjson
+    - multipart/form-data
+  parameters:
+    - name: user_id
+      in: path
+      required: true
+      description: The ID of the user creating the subscriptions
+    - name: file
+      in: formData
+      type: file
+      description: CSV or NDJSON file, when not sent as the request body
+    - name: format
+      in: query
+      type: string
+      enum: [csv, ndjson]
+      description: Format of the upload, guessed from its content type
+  responses:
+    200:
+      description: Import done, with the errors of the rejected rows.
+        Rows after one that is not valid UTF-8 or CSV are not read, the
+        rows before it are imported.
+    400:
+      description: Unknown upload format
+    404:
+      description: User not found
+  """
+  subscription_creator = storage.get(User, user_id)
+  if not subscription_creator:
+    abort(404)
+  upload = request.files.get('file')
+  content_type = upload.mimetype if upload else request.mimetype
+  format = request.args.get('format')
+  if format is None:
+    if content_type in ('text/csv', 'application/csv'):
+      format = 'csv'
+    elif content_type in ('application/x-ndjson', 'application/jsonl',
+                          'application/json-lines'):
+      format = 'ndjson'
+  if format not in ('csv', 'ndjson'):
+    abort(400, description="Upload must be CSV or NDJSON")
+  stream = upload.stream if upload else request.stream
+  report = import_subscriptions(subscription_creator, stream, format)
+  return make_response(jsonify(report.to_dict()), 200)
 
 @app_views.route('/subscriptions/<subscription_id>', methods=['PUT'],
                  strict_slashes=False)
@@ -166,7 +367,7 @@ def update_subscription(subscription_id):
   if not request.get_json():
     abort(400, description="Invalid JSON")
   
-  ignore = ['id', 'created_at', 'updated_at']
+  ignore = ['id', 'created_at', 'updated_at', 'next_notification_at']
 
   data = request.get_json()
   for key, value in data.items():
@@ -174,4 +375,5 @@ def update_subscription(subscription_id):
       if key in data.keys():
         setattr(subscription, key, value)
   subscription.save()
-  return make_response(jsonify(subscription.to_dict()), 200)
+  return make_response(jsonify(Subscription.serializer.dump(subscription)),
+                       200)
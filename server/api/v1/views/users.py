@@ -1,28 +1,102 @@
 #!/usr/bin/python3
 """ User API endpoints """
+from models.subscription import Subscription
 from models.user import User
 from models import storage
 import requests
 import json
-from api.v1.views import app_views
+from api.v1.ad_client import ADServiceError, CircuitOpenError, ad_client
+from api.v1.response_cache import cached
+from api.v1.export import export_response, mimetypes
+from api.v1.views import app_views, conditional
+from api.v1.views.pagination import (get_date_arg, get_limit, get_role_arg,
+                                     get_status_arg, paginated_response)
 from flask import abort, jsonify, make_response, request
 
+def users_fingerprint():
+  """ Version of the users """
+  count, updated_at = storage.get_fingerprint(User)
+  return "{}|{}".format(count, updated_at), None
+
+def user_subscriptions_fingerprint(user_id):
+  """ Version of the subscriptions of a user matching the request
+  filters
+  """
+  count, updated_at, links = storage.get_fingerprint(
+    Subscription, status=get_status_arg(),
+    expires_after=get_date_arg('expires_after'),
+    expires_before=get_date_arg('expires_before'), user_id=user_id,
+    role=get_role_arg())
+  return "{}|{}|{}".format(count, updated_at, links), None
+
+def user_fingerprint(user_id):
+  """ Version of a user """
+  updated_at = storage.get_updated_at(User, user_id)
+  if updated_at is None:
+    return None
+  return updated_at.isoformat(), updated_at
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
+@conditional(users_fingerprint)
+@cached('users')
 def get_users():
-  """Retrieves the list of all users
+  """Retrieves a page of users ordered by creation date
+  ---
+  parameters:
+    - name: limit
+      in: query
+      type: integer
+      description: Number of users per page (default 100, max 1000)
+    - name: cursor
+      in: query
+      type: string
+      description: The X-Next-Cursor header of the previous page
+  responses:
+    200:
+      description: Users gotten successfully
+    304:
+      description: The client's copy, from If-None-Match, is current
+    400:
+      description: Invalid pagination parameters
+  """
+  try:
+    rows, next_cursor = storage.paginate(User, User.serializer.fields,
+                                         get_limit(),
+                                         cursor=request.args.get('cursor'))
+  except ValueError as err:
+    abort(400, description=str(err))
+  list_users = [User.serializer.dump_row(row) for row in rows]
+  return paginated_response(jsonify(list_users), next_cursor)
+
+@app_views.route('/users/export', methods=['GET'], strict_slashes=False)
+def export_users():
+  """ Streams every user
   ---
+  produces:
+    - application/x-ndjson
+    - text/csv
+  parameters:
+    - name: format
+      in: query
+      type: string
+      enum: [ndjson, csv]
+      description: Export format, ndjson by default
   responses:
     200:
-      description: All users gotten successfully
+      description: Users export
+    400:
+      description: Unknown export format
   """
-  all_users = storage.all(User).values()
-  list_users = []
-  for user in all_users:
-    list_users.append(user.to_dict())
-  return (jsonify(list_users)), 200
+  format = request.args.get('format', 'ndjson')
+  if format not in mimetypes:
+    abort(400, description="Format must be ndjson or csv")
+  fields = ['id', 'email', 'first_name', 'last_name', 'created_at',
+            'updated_at']
+  return export_response(fields, storage.stream_users(), format, 'users')
 
 @app_views.route('/users/<user_id>', methods=['GET'],
                  strict_slashes=False)
+@conditional(user_fingerprint)
 def get_user(user_id):
   """ Gets a user by ID
   ---
@@ -35,13 +109,79 @@ def get_user(user_id):
   responses:
     200:
       description: User information gotten successfully
+    304:
+      description: The client's copy, from If-None-Match or If-Modified-Since, is current
     404:
       description: User not found
   """
   user = storage.get(User, user_id)
   if not user:
     abort(404)
-  return jsonify(user.to_dict()), 200
+  return jsonify(User.serializer.dump(user)), 200
+
+@app_views.route('/users/<user_id>/subscriptions', methods=['GET'],
+                 strict_slashes=False)
+@conditional(user_subscriptions_fingerprint)
+@cached('subscriptions')
+def get_user_subscriptions(user_id):
+  """ Retrieves a page of the subscriptions a user created or is a
+  stakeholder on, ordered by expiry date
+  ---
+  parameters:
+    - name: user_id
+      in: path
+      type: string
+      required: true
+    - name: role
+      in: query
+      type: string
+      enum: [creator, stakeholder]
+      description: Only the subscriptions the user created, or only those
+        they are a stakeholder on. Both by default.
+    - name: limit
+      in: query
+      type: integer
+      description: Number of subscriptions per page (default 100, max 1000)
+    - name: cursor
+      in: query
+      type: string
+      description: The X-Next-Cursor header of the previous page
+    - name: status
+      in: query
+      type: string
+      enum: [active, inactive]
+    - name: expires_after
+      in: query
+      type: string
+      description: ISO date, only subscriptions expiring on or after it
+    - name: expires_before
+      in: query
+      type: string
+      description: ISO date, only subscriptions expiring before it
+  responses:
+    200:
+      description: Subscriptions gotten successfully
+    304:
+      description: The client's copy, from If-None-Match, is current
+    400:
+      description: Invalid pagination or filter parameters
+    404:
+      description: User not found
+  """
+  if storage.get_updated_at(User, user_id) is None:
+    abort(404)
+  try:
+    serializer = Subscription.listing_serializer
+    rows, next_cursor = storage.paginate(
+      Subscription, serializer.fields, get_limit(),
+      cursor=request.args.get('cursor'), status=get_status_arg(),
+      expires_after=get_date_arg('expires_after'),
+      expires_before=get_date_arg('expires_before'), user_id=user_id,
+      role=get_role_arg())
+  except ValueError as err:
+    abort(400, description=str(err))
+  return paginated_response(
+    jsonify([serializer.dump_row(row) for row in rows]), next_cursor)
 
 @app_views.route('/users/<user_id>', methods=['DELETE'],
                  strict_slashes=False)
@@ -92,6 +232,10 @@ def user_auth():
       description: Invalid JSON or missing parameters
     404:
       description: Authentication failed
+    502:
+      description: The AD service failed or timed out
+    503:
+      description: The AD service is failing, calls are suspended
   """
   if not request.get_json():
     abort(400, description="Invalid JSON")
@@ -102,11 +246,12 @@ def user_auth():
     abort(400, description="Missing password")
 
   request_data = request.get_json()
-  response_from_ad_service = requests.post(
-    'https://adservice.abujaelectricity.com/auth/detail',
-    request_data
-  )
-  response = response_from_ad_service.json()
+  try:
+    response = ad_client.authenticate(request_data)
+  except CircuitOpenError:
+    abort(503, description="Authentication service unavailable")
+  except ADServiceError:
+    abort(502, description="Authentication service error")
   print(response)
   if (response['status_code'] == '404'):
     print("GOT TO CONDITIONAL STATEMENT")
@@ -194,4 +339,4 @@ def update_user(user_id):
     if key not in ignore:
       setattr(user, key, value)
   user.save()
-  return make_response(jsonify(user.to_dict()), 201)
+  return make_response(jsonify(User.serializer.dump(user)), 201)
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+""" Load test of the threaded Flask server against the ASGI entry point.
+
+Seeds a SQLite database, starts a stub AD service answering after
+--ad-delay seconds, then runs each server in turn and sends it
+--requests requests, --concurrency at a time: dashboard listings
+(GET /api/v1/subscriptions) and logins (POST /api/v1/users, each with
+new credentials so that the AD cache never answers). Prints the p50
+and p99 latency of each kind of request.
+
+  cd server && python benchmarks/asgi_load.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import httpx
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+servers = {
+  "threaded": [sys.executable, "-c",
+               "from api.v1.app import create_app; "
+               "create_app().run(port={port}, threaded=True)"],
+  "asgi": [sys.executable, "-m", "uvicorn", "api.v1.asgi:application",
+           "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def stub_ad_service(delay):
+  """ Starts an AD service answering every login after delay seconds,
+  returns its URL
+  """
+  class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+      form = parse_qs(self.rfile.read(
+        int(self.headers["Content-Length"])).decode())
+      time.sleep(delay)
+      username = form["username"][0]
+      body = json.dumps({"status_code": "200", "data": {
+        "mail": username + "@aedc.test", "firstname": "Load",
+        "surname": username}}).encode()
+      self.send_response(200)
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):
+      pass
+
+  server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return "http://127.0.0.1:{}/auth".format(server.server_port)
+
+
+def seed(count):
+  """ Creates the tables and count subscriptions with one stakeholder """
+  from models import storage
+  from models.user import User
+  storage.create_all()
+  user = User(first_name="Bench", last_name="Mark", email="bench@aedc.test")
+  storage.new(user)
+  storage.save()
+  now = datetime.utcnow()
+  storage.bulk_insert_subscriptions(
+    [{"id": "sub-{:07d}".format(i), "created_at": now, "updated_at": now,
+      "subscription_name": "Subscription {}".format(i),
+      "subscription_status": True, "start_date": now,
+      "expiry_date": now + timedelta(days=i % 365), "created_by": user.id}
+     for i in range(count)],
+    [{"user_id": user.id, "subscription_id": "sub-{:07d}".format(i)}
+     for i in range(count)])
+  storage.close()
+
+
+def percentile(values, fraction):
+  """ Gets the value below which fraction of the sorted values are """
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def load(port, requests, concurrency, login_share):
+  """ Sends the requests and returns their latencies by kind """
+  latencies = {"dashboard": [], "login": []}
+  queue = asyncio.Queue()
+  for i in range(requests):
+    queue.put_nowait("login" if i % round(1 / login_share) == 0
+                     else "dashboard")
+  base = "http://127.0.0.1:{}/api/v1".format(port)
+  limits = httpx.Limits(max_connections=concurrency)
+
+  async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+    async def worker(number):
+      while not queue.empty():
+        kind = queue.get_nowait()
+        start = time.perf_counter()
+        if kind == "login":
+          response = await client.post(base + "/users", json={
+            "username": "u{}x{}".format(number, time.perf_counter_ns()),
+            "password": "secret"})
+        else:
+          response = await client.get(base + "/subscriptions?limit=100")
+        response.raise_for_status()
+        latencies[kind].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def wait_until_up(port, process):
+  """ Waits for a server to answer """
+  for _ in range(200):
+    if process.poll() is not None:
+      raise RuntimeError("server exited with {}".format(process.returncode))
+    try:
+      httpx.get("http://127.0.0.1:{}/api/v1/status".format(port))
+      return
+    except httpx.HTTPError:
+      time.sleep(0.1)
+  raise RuntimeError("server did not start")
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--rows", type=int, default=2000)
+  parser.add_argument("--requests", type=int, default=500)
+  parser.add_argument("--concurrency", type=int, default=50)
+  parser.add_argument("--login-share", type=float, default=0.2)
+  parser.add_argument("--ad-delay", type=float, default=0.3)
+  parser.add_argument("--port", type=int, default=5055)
+  parser.add_argument("servers", nargs="*", default=list(servers))
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp()
+  env = dict(os.environ,
+             DATABASE_URL="sqlite:///" + os.path.join(directory, "bench.db"),
+             ASYNC_DATABASE_URL="", ENABLE_CELERY="0", ENABLE_SWAGGER="0",
+             FLASK_DEBUG="0", RESPONSE_CACHE="off",
+             AD_AUTH_URL=stub_ad_service(args.ad_delay),
+             AD_POOL_SIZE=str(args.concurrency))
+  os.environ.update(env)
+  os.chdir(directory)
+  sys.path.insert(0, server_dir)
+  seed(args.rows)
+  env["PYTHONPATH"] = server_dir
+
+  print("{} requests, {} at a time, {:.0%} logins, AD answers in {}s".format(
+    args.requests, args.concurrency, args.login_share, args.ad_delay))
+  print("{:<10} {:>9} {:>12} {:>12} {:>12} {:>12}".format(
+    "server", "req/s", "dash p50", "dash p99", "login p50", "login p99"))
+  for name in args.servers:
+    command = [part.format(port=args.port) for part in servers[name]]
+    process = subprocess.Popen(command, env=env, cwd=directory,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+      wait_until_up(args.port, process)
+      latencies, seconds = asyncio.run(load(
+        args.port, args.requests, args.concurrency, args.login_share))
+    finally:
+      process.terminate()
+      process.wait()
+    print("{:<10} {:>9.1f} {:>10.0f}ms {:>10.0f}ms {:>10.0f}ms {:>10.0f}ms"
+          .format(name, args.requests / seconds,
+                  *(percentile(latencies[kind], fraction) * 1000
+                    for kind in ("dashboard", "login")
+                    for fraction in (0.5, 0.99))))
+
+
+if __name__ == "__main__":
+  main()
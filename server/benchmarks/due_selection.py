@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+""" Reminder worker time against the size of the subscriptions table.
+
+Grows a SQLite table to each of the --sizes, with --due subscriptions
+due a reminder at every size and the others notified half a day ago,
+then times:
+
+  - the scan the sweep used to do: every subscription loaded with
+    storage.all and checked against the reminder tiers in Python,
+    without sending anything
+  - a whole sweep, send_email_task run by eager Celery tasks with the
+    in-memory email transport: the due subscriptions are selected on
+    next_notification_at, sent and recorded
+
+  cd server && python benchmarks/due_selection.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def was_due(subscription, now, notification_tiers):
+  """ The tier rules the sweep checked every subscription against """
+  if subscription.last_notification is None:
+    return True
+  for above, up_to, cadence in notification_tiers:
+    if (subscription.last_notification <= now - timedelta(days=cadence) and
+        (above is None or
+         subscription.expiry_date > now + timedelta(days=above)) and
+        (up_to is None or
+         subscription.expiry_date <= now + timedelta(days=up_to))):
+      return True
+  return False
+
+
+def grow(storage, user, first, count, due, now):
+  """ Inserts count subscriptions numbered from first, the first due of
+  them due a reminder
+  """
+  rows = []
+  for number in range(first, first + count):
+    notified = now - timedelta(days=40 if number - first < due else 0.5)
+    rows.append({"id": "sub-{:08d}".format(number), "created_at": now,
+                 "updated_at": now,
+                 "subscription_name": "Subscription {}".format(number),
+                 "subscription_status": True, "start_date": now,
+                 "expiry_date": now + timedelta(days=number % 365 + 1),
+                 "last_notification": notified, "created_by": user.id})
+  storage.bulk_insert_subscriptions(rows, [
+    {"user_id": user.id, "subscription_id": row["id"]} for row in rows])
+  storage.close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--sizes", type=int, nargs="+",
+                      default=[1000, 10000, 100000])
+  parser.add_argument("--due", type=int, default=100)
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp()
+  os.environ.update(
+    DATABASE_URL="sqlite:///" + os.path.join(directory, "bench.db"),
+    ENABLE_SWAGGER="0", RESPONSE_CACHE="off", EMAIL_BACKEND="memory",
+    EMAIL_RETRY_DELAY="0", CELERY_ALWAYS_EAGER="1",
+    CELERY_BROKER_URL="memory://", CELERY_RESULT_BACKEND="cache+memory://")
+  os.chdir(directory)
+  sys.path.insert(0, server_dir)
+  from api.v1 import email_service
+  from api.v1.app import create_app
+  from api.v1.email_transport import get_transport
+  from models import storage
+  from models.subscription import Subscription, notification_tiers
+  from models.user import User
+  create_app(swagger=False)
+  storage.create_all()
+  user = User(first_name="Bench", last_name="Mark", email="bench@aedc.test")
+  storage.new(user)
+  storage.save()
+
+  print("{} due at every size".format(args.due))
+  print("{:>9} {:>14} {:>14} {:>6}".format("rows", "full scan", "sweep",
+                                           "sent"))
+  size = 0
+  for target in args.sizes:
+    now = datetime.utcnow()
+    grow(storage, user, size, target - size, args.due, now)
+    size = target
+
+    start = time.perf_counter()
+    due = sum(1 for subscription in storage.all(Subscription).values()
+              if was_due(subscription, now, notification_tiers))
+    scan = time.perf_counter() - start
+    storage.close()
+
+    outbox = get_transport().outbox
+    sent = len(outbox)
+    start = time.perf_counter()
+    email_service.send_email_task.delay().get()
+    sweep = time.perf_counter() - start
+    storage.close()
+    sent = len(outbox) - sent
+    assert sent == due == args.due, (sent, due)
+    print("{:>9} {:>12.1f}ms {:>12.1f}ms {:>6}".format(
+      size, scan * 1000, sweep * 1000, sent))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+""" Peak memory of exporting every subscription.
+
+Seeds a SQLite database with --rows subscriptions, then runs each way
+of getting them all out in its own process and prints the peak RSS of
+that process, before and after the export:
+
+  - GET /api/v1/subscriptions/export, as NDJSON and as CSV, reading the
+    streamed body as a client would
+  - the full list the endpoints built before, every subscription loaded
+    as an ORM object and dumped as indented JSON in one string
+
+  cd server && python benchmarks/export_rss.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+modes = ("ndjson", "csv", "full list")
+
+
+def peak_rss():
+  """ Gets the peak RSS of the process in MB. VmHWM starts over at exec,
+  unlike ru_maxrss which keeps the peak of the forked parent.
+  """
+  with open("/proc/self/status") as status:
+    for line in status:
+      if line.startswith("VmHWM:"):
+        return int(line.split()[1]) / 1024
+
+
+def seed(count, batch=50000):
+  """ Creates the tables and count subscriptions with two stakeholders """
+  from models import storage
+  from models.user import User
+  storage.create_all()
+  users = [User(first_name="Bench", last_name="Mark",
+                email="bench{}@aedc.test".format(number))
+           for number in range(2)]
+  for user in users:
+    storage.new(user)
+  storage.save()
+  now = datetime.utcnow()
+  for first in range(0, count, batch):
+    numbers = range(first, min(first + batch, count))
+    storage.bulk_insert_subscriptions(
+      [{"id": "sub-{:08d}".format(i), "created_at": now, "updated_at": now,
+        "subscription_name": "Subscription {}".format(i),
+        "subscription_status": True, "start_date": now,
+        "expiry_date": now + timedelta(days=i % 365),
+        "created_by": users[0].id} for i in numbers],
+      [{"user_id": user.id, "subscription_id": "sub-{:08d}".format(i)}
+       for i in numbers for user in users])
+  storage.close()
+
+
+def measure(mode):
+  """ Exports the subscriptions one way, prints the size of the export,
+  the time it took and the peak RSS before and after as JSON
+  """
+  from api.v1.app import create_app
+  from models import storage
+  from models.subscription import Subscription
+  client = create_app(swagger=False, celery=False).test_client()
+  before = peak_rss()
+  start = time.perf_counter()
+  if mode == "full list":
+    # what GET /api/v1/subscriptions did before it was paginated
+    subscriptions = [Subscription.serializer.dump(subscription) for
+                     subscription in storage.all(Subscription).values()]
+    size = len(json.dumps(subscriptions, indent=2, default=str))
+  else:
+    response = client.get("/api/v1/subscriptions/export?format=" + mode,
+                          buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+  print(json.dumps({"bytes": size, "seconds": time.perf_counter() - start,
+                    "before": before, "peak": peak_rss()}))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--rows", type=int, default=500000)
+  parser.add_argument("--measure", choices=modes, help=argparse.SUPPRESS)
+  args = parser.parse_args()
+  sys.path.insert(0, server_dir)
+  if args.measure:
+    return measure(args.measure)
+
+  directory = tempfile.mkdtemp()
+  os.environ.update(
+    DATABASE_URL="sqlite:///" + os.path.join(directory, "bench.db"),
+    ENABLE_CELERY="0", ENABLE_SWAGGER="0", RESPONSE_CACHE="off")
+  os.chdir(directory)
+  seed(args.rows)
+
+  print("{} subscriptions with 2 stakeholders each".format(args.rows))
+  print("{:<10} {:>10} {:>10} {:>12} {:>10}".format(
+    "", "MB out", "seconds", "RSS before", "peak RSS"))
+  for mode in modes:
+    output = subprocess.run(
+      [sys.executable, os.path.abspath(__file__), "--measure", mode],
+      env=dict(os.environ, PYTHONPATH=server_dir), check=True,
+      capture_output=True, text=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    print("{:<10} {:>10.1f} {:>10.1f} {:>10.0f}MB {:>8.0f}MB".format(
+      mode, result["bytes"] / 2 ** 20, result["seconds"], result["before"],
+      result["peak"]))
+
+
+if __name__ == "__main__":
+  main()
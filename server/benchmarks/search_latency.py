@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+""" Latency of GET /api/v1/subscriptions/search against table size.
+
+Seeds a SQLite database with --rows subscriptions, named after a few
+dozen products, with two stakeholders each out of --users, indexed in
+trigrams as they are inserted. Then sends each query --repeat times
+and prints the number of matches and the p50 and p99 latency of the
+first page, next to a LIKE scan of the names without the index.
+
+  cd server && python benchmarks/search_latency.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+products = ["Microsoft Office", "Adobe Acrobat", "Adobe Photoshop", "Zoom",
+            "Slack", "Autodesk AutoCAD", "Oracle Database", "SAP ERP",
+            "Kaspersky Endpoint", "Sophos Firewall", "Cisco Webex",
+            "Atlassian Jira", "GitHub Enterprise", "Salesforce", "Dropbox",
+            "Google Workspace", "Fortinet FortiGate", "VMware vSphere",
+            "Veeam Backup", "ArcGIS", "MATLAB", "Tableau", "Power BI",
+            "QuickBooks", "Sage Payroll", "Norton Security",
+            "Red Hat Enterprise Linux", "Windows Server", "SQL Server",
+            "Exchange Online"]
+first_names = ["Ada", "Emeka", "Chioma", "Tunde", "Ngozi", "Bola", "Ibrahim",
+               "Aisha", "Yusuf", "Funke", "Segun", "Halima", "Obinna",
+               "Zainab", "Kelechi", "Amina", "Femi", "Hauwa", "Uche", "Musa"]
+last_names = ["Obi", "Bello", "Adeyemi", "Okafor", "Abubakar", "Eze",
+              "Ogunleye", "Danjuma", "Nwosu", "Lawal", "Okonkwo", "Sani",
+              "Adebayo", "Umar", "Chukwu", "Aliyu", "Balogun", "Ibekwe",
+              "Garba", "Ojo"]
+queries = [("common name", "office"), ("rare name", "arcgis 12"),
+           ("prefix", "kasp"), ("email", "chioma.bello"),
+           ("no match", "xylophone")]
+
+
+def seed(count, users, batch=20000):
+  """ Creates the tables and count subscriptions with two stakeholders
+  each
+  """
+  from models import storage
+  from models.user import User
+  storage.create_all()
+  people = []
+  for number in range(users):
+    first_name = first_names[number % len(first_names)]
+    last_name = last_names[number // len(first_names) % len(last_names)]
+    people.append(User(first_name=first_name, last_name=last_name,
+                       email="{}.{}{}@aedc.test".format(
+                         first_name, last_name,
+                         number // 400 or "").lower()))
+  for user in people:
+    storage.new(user)
+  storage.save()
+  ids = [user.id for user in people]
+  now = datetime.utcnow()
+  for first in range(0, count, batch):
+    numbers = range(first, min(first + batch, count))
+    storage.bulk_insert_subscriptions(
+      [{"id": "sub-{:08d}".format(i), "created_at": now, "updated_at": now,
+        "subscription_name": "{} {}".format(products[i % len(products)],
+                                            i // len(products)),
+        "subscription_status": True, "start_date": now,
+        "expiry_date": now + timedelta(days=i % 365),
+        "created_by": ids[0]} for i in numbers],
+      [{"user_id": ids[(i * 7 + offset) % users],
+        "subscription_id": "sub-{:08d}".format(i)}
+       for i in numbers for offset in (0, 1)])
+    print("seeded {}".format(numbers[-1] + 1), file=sys.stderr)
+  storage.close()
+
+
+def percentile(values, fraction):
+  """ Gets the value below which fraction of the sorted values are """
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def timed(function, repeat):
+  """ Runs function repeat times, returns its last result and times """
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = function()
+    times.append(time.perf_counter() - start)
+  return result, times
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--rows", type=int, default=100000)
+  parser.add_argument("--users", type=int, default=1000)
+  parser.add_argument("--repeat", type=int, default=20)
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp()
+  os.environ.update(
+    DATABASE_URL="sqlite:///" + os.path.join(directory, "bench.db"),
+    ENABLE_CELERY="0", ENABLE_SWAGGER="0", RESPONSE_CACHE="off")
+  os.chdir(directory)
+  sys.path.insert(0, server_dir)
+  start = time.perf_counter()
+  seed(args.rows, args.users)
+  seconds = time.perf_counter() - start
+  from api.v1.app import create_app
+  from sqlalchemy import create_engine, text
+  client = create_app(swagger=False, celery=False).test_client()
+  engine = create_engine(os.environ["DATABASE_URL"])
+  with engine.connect() as connection:
+    trigram_rows = connection.execute(text(
+      "SELECT count(*) FROM subscription_trigrams")).scalar()
+
+  def like_scan(query):
+    with engine.connect() as connection:
+      return connection.execute(text(
+        "SELECT id FROM subscriptions WHERE lower(subscription_name) "
+        "LIKE :pattern ORDER BY expiry_date LIMIT 101"),
+        {"pattern": "%{}%".format(query)}).all()
+
+  print("{} subscriptions, {} trigram rows, seeded in {:.0f}s".format(
+    args.rows, trigram_rows, seconds))
+  print("{:<12} {:<13} {:>7} {:>10} {:>10} {:>14}".format(
+    "query", "text", "found", "p50", "p99", "LIKE scan p50"))
+  for name, query in queries:
+    def search():
+      response = client.get("/api/v1/subscriptions/search?q=" + query)
+      assert response.status_code == 200
+      return response
+    response, times = timed(search, args.repeat)
+    found = len(response.get_json())
+    if "X-Next-Cursor" in response.headers:
+      found = "{}+".format(found)
+    _, scan = timed(lambda: like_scan(query), args.repeat)
+    print("{:<12} {:<13} {:>7} {:>8.1f}ms {:>8.1f}ms {:>12.1f}ms".format(
+      name, query, found, percentile(times, 0.5) * 1000,
+      percentile(times, 0.99) * 1000, percentile(scan, 0.5) * 1000))
+
+
+if __name__ == "__main__":
+  main()
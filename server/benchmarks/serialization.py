@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+""" Microbenchmarks of the serialization of the subscriptions listing.
+
+Seeds a SQLite database with --rows subscriptions, then times, best of
+--repeat runs (loading the rows included, but not the stakeholder
+emails of ORM objects):
+
+  - turning the rows into dicts: ORM objects through the strftime based
+    to_dict the models had before Serializer, ORM objects through
+    Serializer.dump, and column tuples from storage.paginate through
+    Serializer.dump_row, the path the list endpoints take
+  - encoding the dicts as JSON with Flask's default provider and with
+    OrjsonProvider, compact and indented
+
+  cd server && python benchmarks/serialization.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the format BaseModel.to_dict used with strftime
+strftime_format = "%Y-%m-%dT%H:%M:%S.%f"
+dashboard_keys = ['subscription_name', 'subscription_status', 'start_date',
+                  'expiry_date', 'users']
+
+
+def old_to_dict(obj):
+  """ BaseModel.to_dict as it was before Serializer """
+  new_dict = obj.__dict__.copy()
+  if "created_at" in new_dict:
+    new_dict["created_at"] = new_dict["created_at"].strftime(strftime_format)
+  if "updated_at" in new_dict:
+    new_dict["updated_at"] = new_dict["updated_at"].strftime(strftime_format)
+  new_dict["__class__"] = obj.__class__.__name__
+  if "_sa_instance_state" in new_dict:
+    del new_dict["_sa_instance_state"]
+  return new_dict
+
+
+def old_dashboard_response(subscription, emails):
+  """ Subscription.make_dashboard_response as it was, without its query
+  of the stakeholders
+  """
+  subscription_dict = old_to_dict(subscription)
+  result = {}
+  for key in subscription_dict.keys():
+    if key in dashboard_keys:
+      result[key] = subscription_dict[key]
+  result['users'] = emails
+  return result
+
+
+def seed(count):
+  """ Creates the tables and count subscriptions with one stakeholder """
+  from models import storage
+  from models.user import User
+  storage.create_all()
+  user = User(first_name="Bench", last_name="Mark", email="bench@aedc.test")
+  storage.new(user)
+  storage.save()
+  now = datetime.utcnow()
+  storage.bulk_insert_subscriptions(
+    [{"id": "sub-{:07d}".format(i), "created_at": now, "updated_at": now,
+      "subscription_name": "Subscription {}".format(i),
+      "subscription_status": True, "start_date": now,
+      "expiry_date": now + timedelta(days=i % 365), "created_by": user.id}
+     for i in range(count)],
+    [{"user_id": user.id, "subscription_id": "sub-{:07d}".format(i)}
+     for i in range(count)])
+  storage.close()
+
+
+def best(function, repeat):
+  """ Runs function repeat times, returns its last result and the
+  shortest time it took
+  """
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = function()
+    times.append(time.perf_counter() - start)
+  return result, min(times)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--rows", type=int, default=10000)
+  parser.add_argument("--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  directory = tempfile.mkdtemp()
+  os.environ.update(
+    DATABASE_URL="sqlite:///" + os.path.join(directory, "bench.db"),
+    ENABLE_CELERY="0", ENABLE_SWAGGER="0", RESPONSE_CACHE="off")
+  os.chdir(directory)
+  sys.path.insert(0, server_dir)
+  seed(args.rows)
+  from flask.json.provider import DefaultJSONProvider
+  from api.v1.app import create_app
+  from api.v1.json_provider import OrjsonProvider
+  from models import storage
+  from models.serializer import Serializer
+  from models.subscription import Subscription
+  serializer = Subscription.dashboard_serializer
+  # dumping the users relationship of ORM objects would load it row by row
+  object_serializer = Serializer([field for field in serializer.fields
+                                  if field != 'users'])
+  emails = ["bench@aedc.test"]
+
+  def load_objects():
+    storage.close()
+    return storage.all(Subscription).values()
+
+  def orm_old():
+    return [old_dashboard_response(subscription, emails)
+            for subscription in load_objects()]
+
+  def orm_serializer():
+    result = []
+    for subscription in load_objects():
+      row = object_serializer.dump(subscription)
+      row['users'] = emails
+      result.append(row)
+    return result
+
+  def tuples_serializer():
+    rows, _ = storage.paginate(Subscription, serializer.fields, args.rows)
+    return [serializer.dump_row(row) for row in rows]
+
+  print("{} subscriptions, best of {}".format(args.rows, args.repeat))
+  print("{:<36} {:>10} {:>12}".format("to dicts", "ms", "rows/s"))
+  for name, function in (("ORM objects, old to_dict", orm_old),
+                         ("ORM objects, Serializer.dump", orm_serializer),
+                         ("column tuples, Serializer.dump_row",
+                          tuples_serializer)):
+    dicts, seconds = best(function, args.repeat)
+    print("{:<36} {:>10.1f} {:>12.0f}".format(name, seconds * 1000,
+                                              len(dicts) / seconds))
+
+  app = create_app(swagger=False, celery=False)
+  print("{:<36} {:>10} {:>12}".format("to JSON", "ms", "rows/s"))
+  for name, provider in (("default", DefaultJSONProvider(app)),
+                         ("orjson", OrjsonProvider(app))):
+    for indent in (None, 2):
+      _, seconds = best(lambda: provider.dumps(dicts, indent=indent),
+                        args.repeat)
+      print("{:<36} {:>10.1f} {:>12.0f}".format(
+        "{}, {}".format(name, "indented" if indent else "compact"),
+        seconds * 1000, len(dicts) / seconds))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+""" Reminder delivery throughput against a local aiosmtpd server.
+
+Starts an aiosmtpd server that takes --delay seconds to accept each
+message, as a remote relay would, then sends --messages reminders to 3
+stakeholders each:
+
+  - opening a new SMTP connection for every message, one at a time
+  - over the pooled connections of SMTPTransport, one at a time
+  - with deliver(), --concurrency messages in flight over a pool of as
+    many connections
+
+and prints the messages sent per second.
+
+  cd server && python benchmarks/smtp_throughput.py
+"""
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import time
+from email.message import EmailMessage
+
+server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, server_dir)
+
+from aiosmtpd.controller import Controller
+from api.v1.email_delivery import deliver
+from api.v1.email_transport import SMTPTransport
+
+recipients = ["first@aedc.test", "second@aedc.test", "third@aedc.test"]
+
+
+class Handler:
+  """ Accepts every message after a delay, counting them """
+
+  def __init__(self, delay):
+    """ Instantiate a Handler """
+    self.delay = delay
+    self.received = 0
+
+  async def handle_DATA(self, server, session, envelope):
+    """ Accepts a message """
+    if self.delay:
+      await asyncio.sleep(self.delay)
+    self.received += 1
+    return "250 OK"
+
+
+def build(number):
+  """ Builds a reminder like email_service.build_message """
+  message = EmailMessage()
+  message["From"] = "no-reply@abujaelectricity.com"
+  message["To"] = ", ".join(recipients)
+  message["Subject"] = "Subscription {} expires on 01 January 2027".format(
+    number)
+  message.set_content("The subscription {} expires on 01 January 2027 "
+                      "(30 days from now).\nPlease renew it before it runs "
+                      "out.\n".format(number))
+  return message
+
+
+def connection_per_message(host, port, messages):
+  """ Sends each message over a new connection """
+  for message in messages:
+    with smtplib.SMTP(host, port) as connection:
+      connection.send_message(message, to_addrs=recipients)
+
+
+def pooled(host, port, messages):
+  """ Sends the messages one at a time over SMTPTransport """
+  transport = SMTPTransport(host, port, pool_size=1)
+  for message in messages:
+    transport.send(message, recipients)
+  transport.close()
+
+
+def concurrent(host, port, messages, concurrency):
+  """ Sends the messages with deliver() """
+  transport = SMTPTransport(host, port, pool_size=concurrency)
+  results = deliver(transport, [(number, message, recipients)
+                                for number, message in enumerate(messages)],
+                    concurrency=concurrency)
+  transport.close()
+  assert all(not result.failures for result in results)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--messages", type=int, default=500)
+  parser.add_argument("--delay", type=float, default=0.01)
+  parser.add_argument("--port", type=int, default=8025)
+  parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8,
+                                                                     16])
+  args = parser.parse_args()
+
+  handler = Handler(args.delay)
+  host, port = "127.0.0.1", args.port
+  controller = Controller(handler, hostname=host, port=port)
+  controller.start()
+  messages = [build(number) for number in range(args.messages)]
+  runs = [("new connection per message",
+           lambda: connection_per_message(host, port, messages)),
+          ("SMTPTransport, one at a time",
+           lambda: pooled(host, port, messages))]
+  for concurrency in args.concurrency:
+    runs.append(("deliver(), {} in flight".format(concurrency),
+                 lambda concurrency=concurrency: concurrent(
+                   host, port, messages, concurrency)))
+
+  print("{} messages to {} recipients, server accepts each in {}s".format(
+    args.messages, len(recipients), args.delay))
+  print("{:<30} {:>10} {:>10}".format("", "seconds", "msg/s"))
+  try:
+    for name, run in runs:
+      received = handler.received
+      start = time.perf_counter()
+      run()
+      seconds = time.perf_counter() - start
+      assert handler.received - received == args.messages
+      print("{:<30} {:>10.2f} {:>10.1f}".format(name, seconds,
+                                                args.messages / seconds))
+  finally:
+    controller.stop()
+
+
+if __name__ == "__main__":
+  main()
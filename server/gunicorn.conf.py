@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+""" gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app """
+from os import environ
+import glob
+import multiprocessing
+import os
+
+# settings left empty, as in .env.example, take their default
+bind = environ.get("GUNICORN_BIND") or "0.0.0.0:5000"
+workers = int(environ.get("GUNICORN_WORKERS") or
+              multiprocessing.cpu_count() * 2 + 1)
+threads = int(environ.get("GUNICORN_THREADS") or 4)
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(environ.get("GUNICORN_TIMEOUT") or 30)
+# import the app once in the master, workers share its memory
+preload_app = True
+
+# each worker would only drop the cached responses of its own writes
+if workers > 1 and environ.get("RESPONSE_CACHE") == "memory":
+    raise ValueError("RESPONSE_CACHE=memory needs GUNICORN_WORKERS=1, "
+                     "use a redis:// URL with more workers")
+
+
+def on_starting(server):
+    """ Drops the metric files of a previous run, see
+    PROMETHEUS_MULTIPROC_DIR
+    """
+    directory = environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        for name in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(name)
+
+
+def when_ready(server):
+    """ Closes connections the master opened while loading the app, so
+    no worker inherits them
+    """
+    from models import storage
+    storage.dispose()
+
+
+def post_fork(server, worker):
+    """ Gives each worker its own connection pools """
+    from models import storage
+    storage.dispose()
+
+
+def child_exit(server, worker):
+    """ Merges the metric files of a dead worker into the totals """
+    if environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -4,5 +4,5 @@ Initialize the models package
 """
 
 from models.engine.db_storage import DBStorage
+# connects on first use, tables are created by `flask create-db`
 storage = DBStorage()
-storage.reload()
@@ -5,6 +5,7 @@ Contains class BaseModel
 
 from datetime import datetime
 import models
+from models.serializer import format_timestamp
 from sqlalchemy import Column, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
@@ -56,13 +57,12 @@ class BaseModel:
   def to_dict(self):
     """Returns a dictionary representation of all key/values of the instance"""
     new_dict = self.__dict__.copy()
+    new_dict.pop("_sa_instance_state", None)
     if "created_at" in new_dict:
-      new_dict["created_at"] = new_dict["created_at"].strftime(time)
+      new_dict["created_at"] = format_timestamp(new_dict["created_at"])
     if "updated_at" in new_dict:
-      new_dict["updated_at"] = new_dict["updated_at"].strftime(time)
+      new_dict["updated_at"] = format_timestamp(new_dict["updated_at"])
     new_dict["__class__"] = self.__class__.__name__
-    if "_sa_instance_state" in new_dict:
-      del new_dict["_sa_instance_state"]
     return new_dict
   
   def delete(self):
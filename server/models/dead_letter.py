@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+"""DeadLetter model class declaration"""
+
+from models.base_model import BaseModel, Base
+from sqlalchemy import Column, String, Integer, ForeignKey
+
+class DeadLetter(BaseModel, Base):
+  """Reminder that could not be delivered to a recipient"""
+  __tablename__ = 'email_dead_letters'
+  subscription_id = Column(String(60),
+                           ForeignKey('subscriptions.id', onupdate='CASCADE',
+                                      ondelete='CASCADE'),
+                           nullable=False)
+  recipient = Column(String(128), nullable=False)
+  error = Column(String(1024), nullable=False)
+  attempts = Column(Integer, nullable=False)
+
+  def __init__(self, *args, **kwargs):
+    "Iinitializes dead letter"
+    super().__init__(*args, **kwargs)
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""
+Contains the class AsyncDBStorage
+"""
+
+from models.user import User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from os import getenv
+
+
+class AsyncDBStorage:
+  "Sets up asyncio MysqlDB storage for the ASGI entry point"
+
+  def __init__(self, url):
+    """Instantiate an AsyncDBStorage object"""
+    self.__engine = create_async_engine(
+      url,
+      pool_pre_ping=getenv("DB_POOL_PRE_PING", "1") == "1",
+      pool_recycle=int(getenv("DB_POOL_RECYCLE", 3600)),
+      pool_size=int(getenv("DB_POOL_SIZE", 5)),
+      max_overflow=int(getenv("DB_MAX_OVERFLOW", 10)),
+      pool_timeout=float(getenv("DB_POOL_TIMEOUT", 30)))
+    self.__sessions = sessionmaker(self.__engine, class_=AsyncSession,
+                                   expire_on_commit=False)
+
+  async def get_user_by_email(self, email):
+    """ Gets a user by email """
+    async with self.__sessions() as session:
+      result = await session.execute(select(User).filter_by(email=email))
+      return result.scalars().first()
+
+  async def save(self, obj):
+    """ Adds an object to a new session and commits it """
+    async with self.__sessions() as session:
+      session.add(obj)
+      await session.commit()
+
+  async def close(self):
+    """ Closes every pooled connection """
+    await self.__engine.dispose()
+
+
+def make_async_storage():
+  """Builds the AsyncDBStorage of ASYNC_DATABASE_URL. Without it, the
+  MySQL settings are used through aiomysql unless DATABASE_URL points
+  elsewhere, in which case None is returned.
+  """
+  url = getenv("ASYNC_DATABASE_URL")
+  if not url and not getenv("DATABASE_URL"):
+    url = 'mysql+aiomysql://{}:{}@{}/{}'.format(
+      getenv("USER"), getenv("PASSWORD"), getenv("HOST"), getenv("DB"))
+  if not url:
+    return None
+  return AsyncDBStorage(url)
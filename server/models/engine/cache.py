@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+Contains the class TTLCache
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+  """Thread safe least recently used cache whose entries expire"""
+
+  def __init__(self, maxsize=1024, ttl=300):
+    """Instantiate a TTLCache holding at most maxsize entries, each for
+    ttl seconds
+    """
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.__entries = OrderedDict()
+    self.__lock = threading.Lock()
+
+  def get(self, key, default=None):
+    """Gets the value cached for a key, or default"""
+    with self.__lock:
+      entry = self.__entries.get(key)
+      if entry is None or entry[1] < time.monotonic():
+        if entry is not None:
+          del self.__entries[key]
+        self.misses += 1
+        return default
+      self.__entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def set(self, key, value):
+    """Caches a value for a key, evicting the least recently used entry
+    when the cache is full
+    """
+    with self.__lock:
+      self.__entries[key] = (value, time.monotonic() + self.ttl)
+      self.__entries.move_to_end(key)
+      while len(self.__entries) > self.maxsize:
+        self.__entries.popitem(last=False)
+        self.evictions += 1
+
+  def delete(self, key):
+    """Removes the entry of a key"""
+    with self.__lock:
+      self.__entries.pop(key, None)
+
+  def clear(self):
+    """Removes every entry"""
+    with self.__lock:
+      self.__entries.clear()
+
+  def stats(self):
+    """Gets the hit, miss and eviction counters"""
+    return {"hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions, "size": len(self.__entries)}
@@ -4,11 +4,29 @@ Contains the class DBStorage
 """
 
 import models
-from sqlalchemy import create_engine, select
+import base64
+import json
+import threading
+import time
+from itertools import groupby
+from datetime import datetime
+from sqlalchemy import (and_, case, create_engine, func, inspect, or_,
+                        select, text)
+from sqlalchemy.pool import QueuePool
 from models.base_model import Base, BaseModel
+from models.engine.cache import TTLCache
+from models.dead_letter import DeadLetter
+from models.notification_run import NotificationRun
 from models.user import User
-from models.subscription import Subscription
-from sqlalchemy.orm import scoped_session, sessionmaker
+from models.subscription import (Subscription, next_notification_time,
+                                 user_subscriptions)
+from models.subscription_summary import (bucket_bounds, count_mappings,
+                                         apply_changes, expiry_buckets,
+                                         get_as_of, subscription_summary,
+                                         today)
+from models.subscription_search import (index_subscriptions,
+                                        subscription_trigrams, trigrams)
+from sqlalchemy.orm import scoped_session, selectinload, sessionmaker
 from os import getenv
 from dotenv import load_dotenv
 
@@ -16,28 +34,167 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 # declare classes
-classes = {"User": User, "Subscription": Subscription}
+classes = {"User": User, "Subscription": Subscription,
+           "DeadLetter": DeadLetter, "NotificationRun": NotificationRun}
+# NotificationRun columns summed by get_notification_run_totals
+notification_run_totals = ("scanned", "due", "sent", "failed",
+                           "query_seconds", "render_seconds",
+                           "send_seconds", "commit_seconds")
+# column each class is paginated on, ties are broken by id
+page_order = {"User": "created_at", "Subscription": "expiry_date"}
+
+
+def encode_cursor(value, id):
+  """Encodes the keyset of the last row of a page into an opaque cursor"""
+  raw = json.dumps([value.isoformat(), id])
+  return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+  """Decodes a cursor made by encode_cursor, raises ValueError if invalid"""
+  try:
+    value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(value), str(id)
+  except (TypeError, ValueError) as err:
+    raise ValueError("Invalid cursor") from err
+
+
+def escape_like(text):
+  """Escapes the wildcards of a LIKE pattern, with backslashes"""
+  return text.replace("\\", "\\\\").replace("%", "\\%").replace(
+    "_", "\\_")
+
+
+def filter_subscriptions(query, status=None, expires_after=None,
+                         expires_before=None, user_id=None, role=None):
+  """Applies the status and expiry window filters of subscription lists,
+  and keeps the subscriptions of user_id in a role: 'creator',
+  'stakeholder', or either when role is None
+  """
+  if user_id is not None:
+    created = Subscription.created_by == user_id
+    stakeholder = Subscription.id.in_(
+      select(user_subscriptions.c.subscription_id).where(
+        user_subscriptions.c.user_id == user_id))
+    if role == 'creator':
+      query = query.filter(created)
+    elif role == 'stakeholder':
+      query = query.filter(stakeholder)
+    else:
+      query = query.filter(or_(created, stakeholder))
+  if status is not None:
+    query = query.filter(Subscription.subscription_status == status)
+  if expires_after is not None:
+    query = query.filter(Subscription.expiry_date >= expires_after)
+  if expires_before is not None:
+    query = query.filter(Subscription.expiry_date < expires_before)
+  return query
+
+
+def engine_options(url):
+  """Reads the connection pool settings of an engine from the environment"""
+  options = {
+    "pool_pre_ping": getenv("DB_POOL_PRE_PING", "1") == "1",
+    "pool_recycle": int(getenv("DB_POOL_RECYCLE", 3600)),
+  }
+  if url.startswith("sqlite"):
+    if url in ("sqlite://", "sqlite:///:memory:"):
+      return options
+    options["connect_args"] = {"check_same_thread": False}
+  options.update(poolclass=QueuePool,
+                 pool_size=int(getenv("DB_POOL_SIZE", 5)),
+                 max_overflow=int(getenv("DB_MAX_OVERFLOW", 10)),
+                 pool_timeout=float(getenv("DB_POOL_TIMEOUT", 30)))
+  return options
+
 
 class DBStorage:
   "Sets up MysqlDB storage"
-  __engine = None
-  __session = None
 
   def __init__(self):
-    """Instantiate a DBStorage object"""
+    """Instantiate a DBStorage object. Engines and sessions are created
+    on first use, see reload()
+    """
     USER=getenv("USER")
     PASSWORD=getenv("PASSWORD")
     HOST=getenv("HOST")
     DB=getenv("DB") 
-    print(f'{USER}, {PASSWORD}, {HOST}, {DB}')
-    self.__engine = create_engine(f'mysql+mysqldb://{USER}:{PASSWORD}@{HOST}/{DB}')
+    # an empty DATABASE_URL, as in .env.example, also means MySQL
+    self.__url = (getenv("DATABASE_URL") or
+                  f'mysql+mysqldb://{USER}:{PASSWORD}@{HOST}/{DB}')
+    self.__replica_url = getenv("DB_REPLICA_URL")
+    self.__engines = None
+    self.__sessions = None
+    self.__connect_lock = threading.Lock()
+    self.__local = threading.local()
+    self.__email_cache = None
+    cache_ttl = float(getenv("USER_CACHE_TTL", 300))
+    if cache_ttl > 0:
+      self.__email_cache = TTLCache(int(getenv("USER_CACHE_SIZE", 10000)),
+                                    cache_ttl)
+
+  def __connect(self):
+    """Creates the engines and sessions unless done already"""
+    if self.__sessions is None:
+      with self.__connect_lock:
+        if self.__sessions is None:
+          self.reload()
+
+  @property
+  def __engine(self):
+    """Engine of the primary database"""
+    self.__connect()
+    return self.__engines[0]
+
+  @property
+  def __session(self):
+    """Session of the primary database"""
+    self.__connect()
+    return self.__sessions[0]
+
+  @property
+  def __replica_session(self):
+    """Session of the read replica, None without one"""
+    self.__connect()
+    return self.__sessions[1]
+
+  def __begin(self):
+    """Begins a transaction on the primary session unless one is open:
+    outside a transaction, bulk_insert_mappings and bulk_update_mappings
+    commit by themselves
+    """
+    session = self.__session()
+    if not session.in_transaction():
+      session.begin()
+
+  def __reader(self):
+    """Gets the session reads go to: the replica session when reads of
+    the current thread were routed to it, else the primary session
+    """
+    if self.__replica_session and getattr(self.__local, "replica", False):
+      return self.__replica_session
+    return self.__session
+
+  def use_replica(self):
+    """Routes the reads of the current thread to the read replica, when
+    one is configured, until use_primary() or close() is called
+    """
+    self.__local.replica = True
+
+  def use_primary(self):
+    """Routes the reads of the current thread back to the primary"""
+    self.__local.replica = False
+
+  def reads_replica(self):
+    """Tells if the reads of the current thread go to the read replica"""
+    return self.__reader() is not self.__session
     
   def all(self, cls=None):
     """ Gets all objects of a specific class, or all classes """
     new_dict = {}
     for clss in classes:
       if cls is None or cls is classes[clss] or cls is clss:
-        objs = self.__session.query(classes[clss]).all()
+        objs = self.__reader().query(classes[clss]).all()
         for obj in objs:
           key = obj.__class__.__name__+'.'+obj.id
           new_dict[key] = obj
@@ -47,30 +204,427 @@ class DBStorage:
     """ Gets an object of a class by ID """
     for clss in classes:
       if cls is classes[clss] or cls is  clss:
-        obj = self.__session.query(classes[clss]).get(id)
+        obj = self.__reader().query(classes[clss]).get(id)
     return (obj)
   
   def get_user_by_email(self, email):
-    """ Gets a user by email """
-    # print("GOT HERE!!!!!!!!!!!")
-    result = self.__session.query(User).filter_by(email=email).first()
-    print("Result", result)
+    """ Gets a user by email, through the email to id cache if enabled """
+    if self.__email_cache is not None:
+      id = self.__email_cache.get(email)
+      if id is not None:
+        result = self.__reader().query(User).get(id)
+        if result is not None and result.email == email:
+          return(result)
+        self.__email_cache.delete(email)
+    result = self.__reader().query(User).filter_by(email=email).first()
+    if result is not None and self.__email_cache is not None:
+      self.__email_cache.set(email, result.id)
     return(result)
 
-  def get_users_associated_with_a_subscription(self, subscription_id):
-    """Gets the users associated with a subscription"""
-    # print("GOT HERE!!!!!!!!!!!")
-    subscription = self.__session.query(Subscription).filter_by(id=subscription_id).first()
-    users = []
-    for user in subscription.users:
-      users.append(user.email)
-    # print("Users associated with subscription", users)
-    return(users)
+  def get_users_by_emails(self, emails):
+    """ Gets the users of many emails in one query, in the order of the
+    emails. Emails without a user give None.
+    """
+    users = {}
+    if emails:
+      for user in self.__reader().query(User).filter(
+          User.email.in_(set(emails))):
+        users[user.email] = user
+        if self.__email_cache is not None:
+          self.__email_cache.set(user.email, user.id)
+    return [users.get(email) for email in emails]
+
+  def paginate(self, cls, fields, limit, cursor=None, status=None,
+               expires_after=None, expires_before=None, user_id=None,
+               role=None):
+    """ Gets one page of rows of a class ordered by its keyset, without
+    building objects. Rows are tuples of the values of fields, where
+    'users' stands for a subscription's stakeholder emails. Returns the
+    rows and the cursor of the next page, or None on the last page.
+    Filters only apply to subscriptions, see filter_subscriptions.
+    """
+    cls = classes.get(cls, cls)
+    sort_column = getattr(cls, page_order[cls.__name__])
+    columns = [getattr(cls, field) for field in fields if field != 'users']
+    query = self.__reader().query(sort_column, cls.id, *columns)
+    if cls is Subscription:
+      query = filter_subscriptions(query, status, expires_after,
+                                   expires_before, user_id, role)
+    if cursor:
+      value, last_id = decode_cursor(cursor)
+      query = query.filter(or_(sort_column > value,
+                               and_(sort_column == value, cls.id > last_id)))
+    rows = query.order_by(sort_column, cls.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+      rows = rows[:limit]
+      next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+    return self.__page(fields, rows), next_cursor
+
+  def __page(self, fields, rows):
+    """ Turns (sort value, id, *columns) rows into tuples of the values
+    of fields, loading the stakeholder emails 'users' stands for
+    """
+    emails = {}
+    if 'users' in fields:
+      emails = self.get_stakeholder_emails([row[1] for row in rows])
+    page = []
+    for row in rows:
+      values = iter(row[2:])
+      page.append(tuple(emails.get(row[1], []) if field == 'users'
+                        else next(values) for field in fields))
+    return page
+
+  def search_subscriptions(self, text, fields, limit, offset=0):
+    """ Gets one page of the subscriptions whose name or a stakeholder
+    email contains text, case insensitively, as tuples of the values of
+    fields like paginate. Candidates come from the trigram index, and
+    are ranked: exact name, name prefix, name substring, then email
+    matches, each by expiry date. Returns the rows and the offset of
+    the next page, or None on the last page. text needs at least 3
+    characters.
+    """
+    text = text.lower()
+    grams = trigrams(text)
+    pattern = "%{}%".format(escape_like(text))
+    name = func.lower(Subscription.subscription_name)
+    candidates = select(subscription_trigrams.c.subscription_id).where(
+      subscription_trigrams.c.trigram.in_(grams)).group_by(
+        subscription_trigrams.c.subscription_id).having(
+          func.count(subscription_trigrams.c.trigram.distinct()) >=
+          len(grams))
+    email_match = select(user_subscriptions.c.subscription_id).join(
+      User, User.id == user_subscriptions.c.user_id).where(
+        user_subscriptions.c.subscription_id == Subscription.id,
+        func.lower(User.email).like(pattern, escape="\\")).exists()
+    rank = case((name == text, 0),
+                (name.like(escape_like(text) + "%", escape="\\"), 1),
+                (name.like(pattern, escape="\\"), 2),
+                else_=3)
+    columns = [getattr(Subscription, field) for field in fields
+               if field != 'users']
+    rows = self.__reader().query(
+      rank, Subscription.id, *columns).filter(
+        Subscription.id.in_(candidates)).filter(
+          or_(name.like(pattern, escape="\\"), email_match)).order_by(
+            rank, Subscription.expiry_date, Subscription.id).offset(
+              offset).limit(limit + 1).all()
+    next_offset = None
+    if len(rows) > limit:
+      rows = rows[:limit]
+      next_offset = offset + limit
+    return self.__page(fields, rows), next_offset
+
+  def reindex_search(self, batch_size=1000):
+    """ Rebuilds the trigram index of every subscription, batch_size
+    subscriptions per transaction. Returns the number indexed.
+    """
+    indexed = 0
+    after = None
+    while True:
+      query = self.__session.query(Subscription.id)
+      if after is not None:
+        query = query.filter(Subscription.id > after)
+      ids = [id for id, in query.order_by(Subscription.id).limit(
+        batch_size)]
+      if not ids:
+        return indexed
+      index_subscriptions(self.__session.connection(), ids)
+      self.__session.commit()
+      indexed += len(ids)
+      after = ids[-1]
+
+  def get_fingerprint(self, cls, status=None, expires_after=None,
+                      expires_before=None, user_id=None, role=None):
+    """ Gets the row count and latest updated_at of a class with one
+    aggregate query, for subscriptions also the number of stakeholder
+    links. Filters only apply to subscriptions.
+    """
+    cls = classes.get(cls, cls)
+    columns = [func.count(cls.id), func.max(cls.updated_at)]
+    if cls is Subscription:
+      columns.append(select(func.count()).select_from(
+        user_subscriptions).scalar_subquery())
+    query = self.__reader().query(*columns)
+    if cls is Subscription:
+      query = filter_subscriptions(query, status, expires_after,
+                                   expires_before, user_id, role)
+    return tuple(query.one())
+
+  def get_updated_at(self, cls, id):
+    """ Gets the updated_at of an object without loading it, None if
+    there is no such object
+    """
+    cls = classes.get(cls, cls)
+    return self.__reader().query(cls.updated_at).filter(
+      cls.id == id).scalar()
+
+  def get_stakeholder_emails(self, subscription_ids):
+    """ Gets the stakeholder emails of many subscriptions in one query,
+    as a dict of lists keyed by subscription id
+    """
+    emails = {}
+    if subscription_ids:
+      query = self.__reader().query(
+        user_subscriptions.c.subscription_id, User.email).join(
+          User, User.id == user_subscriptions.c.user_id).filter(
+            user_subscriptions.c.subscription_id.in_(subscription_ids))
+      for subscription_id, email in query:
+        emails.setdefault(subscription_id, []).append(email)
+    return emails
+
+  def get_due_id_ranges(self, now, chunk_size):
+    """ Splits the subscriptions due a reminder into (first id, last id)
+    ranges of at most chunk_size subscriptions each
+    """
+    ranges = []
+    chunk = []
+    query = self.__session.query(Subscription.id).filter(
+      Subscription.next_notification_at <= now).order_by(Subscription.id)
+    for (id,) in query.yield_per(chunk_size):
+      chunk.append(id)
+      if len(chunk) == chunk_size:
+        ranges.append((chunk[0], chunk[-1]))
+        chunk = []
+    if chunk:
+      ranges.append((chunk[0], chunk[-1]))
+    return ranges
+
+  def get_due_subscriptions(self, now, batch_size, first_id=None,
+                            last_id=None):
+    """ Yields the subscriptions due a reminder in batches of at most
+    batch_size, with their stakeholders loaded. first_id and last_id
+    restrict the sweep to an inclusive id range.
+    """
+    query = self.__session.query(Subscription).options(
+      selectinload(Subscription.users)).filter(
+        Subscription.next_notification_at <= now)
+    if first_id is not None:
+      query = query.filter(Subscription.id >= first_id)
+    if last_id is not None:
+      query = query.filter(Subscription.id <= last_id)
+    after = None
+    while True:
+      page = query if after is None else query.filter(Subscription.id > after)
+      batch = page.order_by(Subscription.id).limit(batch_size).all()
+      if not batch:
+        return
+      yield batch
+      after = batch[-1].id
+
+  def get_earliest_due_subscriptions(self, now, limit):
+    """ Gets the limit subscriptions due a reminder the longest, with
+    their stakeholders loaded
+    """
+    return self.__session.query(Subscription).options(
+      selectinload(Subscription.users)).filter(
+        Subscription.next_notification_at <= now).order_by(
+          Subscription.next_notification_at, Subscription.id).limit(
+            limit).all()
+
+  def get_due_digests(self, now):
+    """ Gets the subscriptions due a reminder grouped by stakeholder, in
+    one query: a list of (email, subscriptions) pairs ordered by email,
+    each list of subscriptions ordered by expiry date. Subscriptions
+    without stakeholders are grouped under a None email.
+    """
+    query = self.__session.query(User.email, Subscription).outerjoin(
+      user_subscriptions,
+      user_subscriptions.c.subscription_id == Subscription.id).outerjoin(
+        User, User.id == user_subscriptions.c.user_id).filter(
+          Subscription.next_notification_at <= now).order_by(
+            User.email, Subscription.expiry_date, Subscription.id)
+    return [(email, [row[1] for row in group])
+            for email, group in groupby(query, key=lambda row: row[0])]
+
+  def get_next_notification_at(self):
+    """ Gets the earliest time a subscription is due a reminder """
+    return self.__session.query(
+      func.min(Subscription.next_notification_at)).scalar()
+
+  def mark_notified(self, subscriptions, when):
+    """ Sets last_notification, and the next_notification_at it leads
+    to, on many subscriptions in one executemany and commits
+    """
+    self.record_notifications(subscriptions, [], when, None)
+
+  def record_notifications(self, notified, postponed_ids, when, until):
+    """ Marks the notified subscriptions as notified at when, moves the
+    next reminder of the subscriptions whose ids are in postponed_ids to
+    until, and commits both at once. Bulk updates skip the ORM, so
+    updated_at is set here.
+    """
+    updated_at = datetime.now()
+    self.__begin()
+    if notified:
+      self.__session.bulk_update_mappings(Subscription, [
+        {"id": subscription.id, "last_notification": when,
+         "next_notification_at": next_notification_time(
+           subscription.expiry_date, when), "updated_at": updated_at}
+        for subscription in notified])
+    if postponed_ids:
+      self.__session.query(Subscription).filter(
+        Subscription.id.in_(postponed_ids)).update(
+          {Subscription.next_notification_at: until,
+           Subscription.updated_at: updated_at},
+          synchronize_session=False)
+    self.__session.commit()
+
+  def backfill_next_notification(self, batch_size=1000):
+    """ Adds the next_notification_at column and its index to a
+    subscriptions table created without them, then computes the column
+    for every row where it is NULL, batch_size rows per transaction.
+    Returns the number of rows updated.
+    """
+    columns = [column["name"] for column in
+               inspect(self.__engine).get_columns("subscriptions")]
+    if "next_notification_at" not in columns:
+      with self.__engine.begin() as connection:
+        connection.execute(text("ALTER TABLE subscriptions ADD COLUMN "
+                                "next_notification_at DATETIME NULL"))
+      for index in Subscription.__table__.indexes:
+        if index.name == "ix_subscriptions_next_notification":
+          index.create(self.__engine)
+    now = datetime.utcnow()
+    updated_at = datetime.now()
+    updated = 0
+    while True:
+      rows = self.__session.query(
+        Subscription.id, Subscription.expiry_date,
+        Subscription.last_notification).filter(
+          Subscription.next_notification_at.is_(None)).order_by(
+            Subscription.id).limit(batch_size).all()
+      if not rows:
+        return updated
+      self.__session.bulk_update_mappings(Subscription, [
+        {"id": id, "next_notification_at": next_notification_time(
+          expiry_date, last_notification, now), "updated_at": updated_at}
+        for id, expiry_date, last_notification in rows])
+      self.__session.commit()
+      updated += len(rows)
+
+  def get_notification_runs(self, limit):
+    """ Gets the latest reminder sweeps, most recent first """
+    return self.__reader().query(NotificationRun).order_by(
+      NotificationRun.started_at.desc()).limit(limit).all()
+
+  def get_notification_run_totals(self):
+    """ Gets the number of reminder sweeps by status, the sums of their
+    counts and phase times, and the duration of the last finished one
+    """
+    session = self.__reader()
+    sums = [func.coalesce(func.sum(getattr(NotificationRun, key)), 0)
+            for key in notification_run_totals]
+    totals = dict(zip(notification_run_totals,
+                      session.query(*sums).one()))
+    totals["runs"] = dict(session.query(
+      NotificationRun.status, func.count(NotificationRun.id)).group_by(
+        NotificationRun.status).all())
+    last = session.query(NotificationRun).filter(
+      NotificationRun.finished_at.isnot(None)).order_by(
+        NotificationRun.started_at.desc()).first()
+    totals["last_duration"] = last.duration if last else None
+    return totals
+
+  def get_subscription_summary(self):
+    """ Gets the rows of the subscription summary as (created_by,
+    subscription_status, bucket, count, as_of) tuples, building the
+    summary first if it never was
+    """
+    rows = self.__reader().execute(subscription_summary.select()).all()
+    if not rows and self.__session.query(Subscription.id).first():
+      self.rebuild_subscription_summary()
+      rows = self.__session.execute(subscription_summary.select()).all()
+    return rows
+
+  def rebuild_subscription_summary(self):
+    """ Recounts the subscription summary from the subscriptions table
+    with the expiry buckets of today, and commits. Returns the number
+    of summary rows.
+    """
+    as_of = today()
+    bucket = case(*[(Subscription.expiry_date < bound, name)
+                    for name, bound in bucket_bounds(as_of)[:-1]],
+                  else_=expiry_buckets[-1][0])
+    rows = self.__session.query(
+      Subscription.created_by, Subscription.subscription_status, bucket,
+      func.count(Subscription.id)).group_by(
+        Subscription.created_by, Subscription.subscription_status,
+        bucket).all()
+    try:
+      self.__session.execute(subscription_summary.delete())
+      if rows:
+        self.__session.execute(subscription_summary.insert(), [
+          {"created_by": created_by, "subscription_status": status,
+           "bucket": name, "count": count, "as_of": as_of}
+          for created_by, status, name, count in rows])
+      self.__session.commit()
+    except Exception:
+      self.__session.rollback()
+      raise
+    return len(rows)
+
+  def bulk_insert_subscriptions(self, subscriptions, links):
+    """ Inserts subscription mappings and their user_subscriptions rows
+    with one executemany per table, and commits them together
+    """
+    for subscription in subscriptions:
+      if subscription.get("next_notification_at") is None:
+        subscription["next_notification_at"] = next_notification_time(
+          subscription["expiry_date"], subscription.get("last_notification"))
+    try:
+      self.__begin()
+      self.__session.bulk_insert_mappings(Subscription, subscriptions)
+      if links:
+        self.__session.execute(user_subscriptions.insert(), links)
+      connection = self.__session.connection()
+      index_subscriptions(connection, [subscription["id"]
+                                       for subscription in subscriptions])
+      as_of = get_as_of(connection)
+      if as_of is not None:
+        apply_changes(connection, count_mappings(subscriptions, as_of), as_of)
+      self.__session.commit()
+    except Exception:
+      self.__session.rollback()
+      raise
+
+  def stream_subscriptions(self, batch_size=1000):
+    """ Yields subscriptions as tuples of columns ending with their
+    stakeholder emails, fetched batch_size rows at a time through a
+    server side cursor
+    """
+    query = self.__reader().query(
+      Subscription.id, Subscription.subscription_name,
+      Subscription.subscription_status, Subscription.start_date,
+      Subscription.expiry_date, Subscription.last_notification,
+      Subscription.created_by, User.email).outerjoin(
+        user_subscriptions,
+        user_subscriptions.c.subscription_id == Subscription.id).outerjoin(
+          User, User.id == user_subscriptions.c.user_id).order_by(
+            Subscription.id)
+    rows = query.execution_options(stream_results=True).yield_per(batch_size)
+    for _, group in groupby(rows, key=lambda row: row[0]):
+      group = list(group)
+      emails = [row[-1] for row in group if row[-1] is not None]
+      yield tuple(group[0][:-1]) + (emails,)
+
+  def stream_users(self, batch_size=1000):
+    """ Yields users as tuples of columns, fetched batch_size rows at a
+    time through a server side cursor
+    """
+    query = self.__reader().query(
+      User.id, User.email, User.first_name, User.last_name,
+      User.created_at, User.updated_at).order_by(User.id)
+    for row in query.execution_options(
+        stream_results=True).yield_per(batch_size):
+      yield tuple(row)
 
   def new(self, obj):
     """Adds a newly created object to the DB session"""
     # print("Got here")
     # print(obj)
+    if isinstance(obj, User):
+      self.__forget_email(obj)
     self.__session.add(obj)
 
   def save(self):
@@ -78,17 +632,73 @@ class DBStorage:
     self.__session.commit()
 
   def close(self):
-    """Call remove() method on the private session attribute"""
-    self.__session.remove()
+    """Call remove() method on the private session attributes"""
+    if self.__sessions is not None:
+      for session in self.__sessions:
+        if session is not None:
+          session.remove()
+    self.use_primary()
 
   def delete(self, obj=None):
     """ Delete an object from the database """
     if obj is not None:
+      if isinstance(obj, User):
+        self.__forget_email(obj)
       self.__session.delete(obj)
 
-  def reload(self):
-    """Reloads data from the database"""
+  def __forget_email(self, user):
+    """ Drops a user from the email to id cache """
+    if self.__email_cache is not None and user.email:
+      self.__email_cache.delete(user.email)
+
+  def dispose(self):
+    """ Drops every pooled connection, e.g. in a freshly forked process
+    so that it never shares connections with its parent
+    """
+    self.close()
+    if self.__engines is not None:
+      for engine in self.__engines:
+        if engine is not None:
+          engine.dispose()
+
+  def pool_status(self):
+    """ Gets the usage of the connection pool. overflow is the number of
+    connections open beyond pool_size: QueuePool.overflow() counts down
+    from -pool_size while the pool fills up.
+    """
+    pool = self.__engine.pool
+    if not isinstance(pool, QueuePool):
+      return {"class": pool.__class__.__name__}
+    return {"class": pool.__class__.__name__,
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow())}
+
+  def ping(self):
+    """ Runs a trivial query, returns its round trip time in ms """
+    start = time.perf_counter()
+    with self.__engine.connect() as connection:
+      connection.execute(text("SELECT 1"))
+    return (time.perf_counter() - start) * 1000
+
+  def create_all(self):
+    """Creates the tables that do not exist yet"""
     Base.metadata.create_all(self.__engine)
-    sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
+
+  def reload(self):
+    """Creates the engines and sessions, connections are only opened
+    when a query needs one
+    """
+    engine = create_engine(self.__url, **engine_options(self.__url))
+    replica_engine = None
+    replica_session = None
+    if self.__replica_url:
+      replica_engine = create_engine(self.__replica_url,
+                                     **engine_options(self.__replica_url))
+      replica_session = scoped_session(
+        sessionmaker(bind=replica_engine, expire_on_commit=False))
+    sess_factory = sessionmaker(bind=engine, expire_on_commit=False)
     Session = scoped_session(sess_factory)
-    self.__session = Session
+    self.__engines = (engine, replica_engine)
+    self.__sessions = (Session, replica_session)
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""NotificationRun model class declaration"""
+
+from models.base_model import BaseModel, Base
+from models.serializer import Serializer
+from sqlalchemy import Column, String, Integer, Float, DateTime
+
+# phases of a sweep whose time is recorded, summed over its chunks
+phases = ('query', 'render', 'send', 'commit')
+
+
+class NotificationRun(BaseModel, Base):
+  """Reminder sweep started by send_email_task, with its counts and the
+  time spent in each phase
+  """
+  __tablename__ = 'notification_runs'
+  started_at = Column(DateTime, nullable=False, index=True)
+  finished_at = Column(DateTime, nullable=True)
+  status = Column(String(16), nullable=False, default='running')
+  chunks = Column(Integer, nullable=False, default=0)
+  scanned = Column(Integer, nullable=False, default=0)
+  due = Column(Integer, nullable=False, default=0)
+  sent = Column(Integer, nullable=False, default=0)
+  failed = Column(Integer, nullable=False, default=0)
+  query_seconds = Column(Float, nullable=False, default=0)
+  render_seconds = Column(Float, nullable=False, default=0)
+  send_seconds = Column(Float, nullable=False, default=0)
+  commit_seconds = Column(Float, nullable=False, default=0)
+  serializer = Serializer(['id', 'started_at', 'finished_at', 'status',
+                           'duration', 'chunks', 'scanned', 'due', 'sent',
+                           'failed', 'query_seconds', 'render_seconds',
+                           'send_seconds', 'commit_seconds'],
+                          timestamps=('started_at', 'finished_at'))
+
+  def __init__(self, *args, **kwargs):
+    "Iinitializes notification run"
+    super().__init__(*args, **kwargs)
+
+  @property
+  def duration(self):
+    """Wall time of the sweep in seconds, None while it runs"""
+    if self.finished_at is None:
+      return None
+    return (self.finished_at - self.started_at).total_seconds()
+
+  def add_chunk(self, result):
+    """Adds the counts and phase times reported by a chunk"""
+    for key in ('scanned', 'due', 'sent', 'failed'):
+      setattr(self, key, (getattr(self, key) or 0) + result[key])
+    for phase in phases:
+      key = phase + '_seconds'
+      setattr(self, key, (getattr(self, key) or 0) + result[key])
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+"""
+Contains the class Serializer
+"""
+
+from operator import attrgetter
+
+
+def format_timestamp(value):
+  """Formats a datetime like BaseModel.to_dict, without strftime"""
+  return value.isoformat(timespec="microseconds")
+
+
+class Serializer:
+  """Turns model objects, or tuples of their column values, into dicts
+  holding an explicit list of fields
+  """
+
+  def __init__(self, fields, timestamps=("created_at", "updated_at"),
+               constants=None):
+    """Instantiate a Serializer of fields. Fields in timestamps are
+    formatted as strings, constants are added to every dict.
+    """
+    self.fields = tuple(fields)
+    self.constants = constants or {}
+    self.__timestamps = [index for index, field in enumerate(self.fields)
+                         if field in timestamps]
+    getter = attrgetter(*self.fields)
+    if len(self.fields) == 1:
+      self.__getter = lambda obj: (getter(obj),)
+    else:
+      self.__getter = getter
+
+  def dump(self, obj):
+    """Serializes an object"""
+    return self.dump_row(self.__getter(obj))
+
+  def dump_row(self, row):
+    """Serializes a sequence of values given in the order of fields"""
+    values = list(row)
+    for index in self.__timestamps:
+      if values[index] is not None:
+        values[index] = format_timestamp(values[index])
+    result = dict(zip(self.fields, values))
+    result.update(self.constants)
+    return result
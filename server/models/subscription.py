@@ -2,9 +2,11 @@
 """Subscription model class declaration"""
 
 from models.base_model import BaseModel , Base
+from models.serializer import Serializer
 import models
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Table
-from datetime import datetime
+from sqlalchemy import (Column, String, Boolean, DateTime, ForeignKey, Index,
+                        Table, event, inspect)
+from datetime import datetime, timedelta
 from sqlalchemy.orm import relationship
 
 user_subscriptions = Table('user_subscriptions', Base.metadata,
@@ -15,43 +17,111 @@ user_subscriptions = Table('user_subscriptions', Base.metadata,
                           Column('subscription_id', String(60),
                                  ForeignKey('subscriptions.id', onupdate='CASCADE',
                                             ondelete='CASCADE'),
-                                            primary_key=True))
+                                            primary_key=True),
+                          # the primary key covers lookups by user_id
+                          Index('ix_user_subscriptions_subscription',
+                                'subscription_id'))
+
+# Reminder cadence: (more than N days left, up to N days left,
+# days between two reminders). None leaves that side of the tier open.
+notification_tiers = [(90, None, 30),
+                      (60, 90, 7),
+                      (30, 60, 3.5),
+                      (None, 30, 1)]
+
+
+def as_datetime(value):
+  """Parses ISO formatted dates given as strings by API clients"""
+  if isinstance(value, str):
+    return datetime.fromisoformat(value)
+  return value
+
+
+def next_notification_time(expiry_date, last_notification, now=None):
+  """Gets the earliest time a subscription is due its next reminder,
+  following notification_tiers. One never notified is due at once.
+  """
+  if last_notification is None:
+    return now or datetime.utcnow()
+  expiry_date = as_datetime(expiry_date)
+  last_notification = as_datetime(last_notification)
+  times = []
+  for above, up_to, cadence in notification_tiers:
+    # the tier applies from expiry_date - up_to days, until
+    # expiry_date - above days (excluded)
+    time = last_notification + timedelta(days=cadence)
+    if up_to is not None:
+      time = max(time, expiry_date - timedelta(days=up_to))
+    if above is None or time < expiry_date - timedelta(days=above):
+      times.append(time)
+  return min(times)
 
 class Subscription(BaseModel, Base):
   "Subscription model class declaration"
   __tablename__ = 'subscriptions'
+  __table_args__ = (
+    Index('ix_subscriptions_expiry_notification',
+          'expiry_date', 'last_notification'),
+    Index('ix_subscriptions_next_notification', 'next_notification_at'),
+    Index('ix_subscriptions_creator_expiry', 'created_by', 'expiry_date'),
+  )
   subscription_name = Column(String(1024), nullable=False)
   subscription_status = Column(Boolean, nullable=False, default=True)
   start_date = Column(DateTime, default=datetime.now(), nullable=False)
   expiry_date = Column(DateTime, nullable=False)
   last_notification = Column(DateTime, default=None)
+  next_notification_at = Column(DateTime, nullable=True)
   created_by = Column(String(60), ForeignKey('users.id'), nullable=False)
   users = relationship("User",
                        secondary=user_subscriptions,
                        viewonly=False)
+  serializer = Serializer(['id', 'created_at', 'updated_at',
+                           'subscription_name', 'subscription_status',
+                           'start_date', 'expiry_date', 'last_notification',
+                           'next_notification_at', 'created_by'],
+                          constants={'__class__': 'Subscription'})
+  listing_serializer = Serializer(['id', 'subscription_name',
+                                   'subscription_status', 'start_date',
+                                   'expiry_date', 'last_notification',
+                                   'created_by', 'users'])
+  dashboard_serializer = Serializer(['subscription_name',
+                                     'subscription_status', 'start_date',
+                                     'expiry_date', 'users'])
 
   def __init__(self, user, *args, **kwargs):
-    "Iinitializes user"
+    """Initializes subscription. users is a string of space separated
+    stakeholder emails, a ValueError is raised if one is unknown
+    """
     if kwargs['users']:
       kwargs['created_by'] = user.id
-      stakeholders_array_string = kwargs['users'].split(" ")
-      stakeholders_array = []
-      for user in stakeholders_array_string:
-        stakeholder = models.storage.get_user_by_email(user)
-        stakeholders_array.append(stakeholder)
+      stakeholders_array_string = kwargs['users'].split()
+      stakeholders_array = models.storage.get_users_by_emails(
+        stakeholders_array_string)
+      unknown = [email for email, stakeholder in
+                 zip(stakeholders_array_string, stakeholders_array)
+                 if stakeholder is None]
+      if unknown:
+        raise ValueError("Unknown stakeholder emails: {}".format(
+          " ".join(unknown)))
       kwargs['users'] = stakeholders_array
       # print(kwargs)
     super().__init__(*args, **kwargs)
-  
-  def make_dashboard_response(self):
-    """ Formats a subscription object to only return necessay info to dashboard """
-    subscription_dict = self.to_dict()
-    users = models.storage.get_users_associated_with_a_subscription(self.id)
-    # print("Users", users)
-    result = {}
-    necessary_keys = ['subscription_name', 'subscription_status', 'start_date', 'expiry_date', 'users']
-    for key in subscription_dict.keys():
-      if key in necessary_keys:
-        result[key] = subscription_dict[key]
-    result['users'] = users
-    return result
+
+
+@event.listens_for(Subscription, "before_insert")
+@event.listens_for(Subscription, "before_update")
+def schedule_notification(mapper, connection, target):
+  """Recomputes next_notification_at when a subscription is created, or
+  its expiry date or last notification changes. Dates set as ISO
+  strings, e.g. by PUT, are stored as the datetimes the schedule was
+  computed from.
+  """
+  state = inspect(target)
+  if (target.next_notification_at is not None and
+      not state.attrs.expiry_date.history.has_changes() and
+      not state.attrs.last_notification.history.has_changes()):
+    return
+  target.expiry_date = as_datetime(target.expiry_date)
+  target.last_notification = as_datetime(target.last_notification)
+  target.next_notification_at = next_notification_time(
+    target.expiry_date, target.last_notification)
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+"""Trigram index of subscription names and stakeholder emails, kept up
+to date as subscriptions and users are written"""
+
+from models.base_model import Base
+from models.subscription import Subscription, user_subscriptions
+from models.user import User
+from sqlalchemy import (Column, String, ForeignKey, Index, Table, event,
+                        inspect, select)
+from sqlalchemy.orm import Session
+
+subscription_trigrams = Table('subscription_trigrams', Base.metadata,
+                              Column('trigram', String(3), nullable=False),
+                              Column('subscription_id', String(60),
+                                     ForeignKey('subscriptions.id',
+                                                onupdate='CASCADE',
+                                                ondelete='CASCADE'),
+                                     nullable=False),
+                              # not unique: case and accent insensitive
+                              # collations may see two trigrams as equal
+                              Index('ix_subscription_trigrams_trigram',
+                                    'trigram', 'subscription_id'),
+                              Index('ix_subscription_trigrams_subscription',
+                                    'subscription_id'))
+
+
+def trigrams(text):
+  """Gets the set of three character substrings of a lowercased text"""
+  text = text.lower()
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index_subscriptions(connection, subscription_ids):
+  """Replaces the trigrams of subscriptions with those of their current
+  name and stakeholder emails
+  """
+  if not subscription_ids:
+    return
+  subscription_ids = list(subscription_ids)
+  texts = {id: [name] for id, name in connection.execute(
+    select(Subscription.id, Subscription.subscription_name).where(
+      Subscription.id.in_(subscription_ids)))}
+  for subscription_id, email in connection.execute(
+      select(user_subscriptions.c.subscription_id, User.email).join(
+        User, User.id == user_subscriptions.c.user_id).where(
+          user_subscriptions.c.subscription_id.in_(subscription_ids))):
+    texts.setdefault(subscription_id, []).append(email)
+  connection.execute(subscription_trigrams.delete().where(
+    subscription_trigrams.c.subscription_id.in_(subscription_ids)))
+  rows = [{'trigram': trigram, 'subscription_id': subscription_id}
+          for subscription_id, values in texts.items()
+          for trigram in set().union(*map(trigrams, values))]
+  if rows:
+    connection.execute(subscription_trigrams.insert(), rows)
+
+
+def changed(obj, *names):
+  """Tells if any of the named attributes of an object changed"""
+  state = inspect(obj)
+  return any(state.attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(Session, "after_flush")
+def update_trigrams(session, flush_context):
+  """Reindexes the subscriptions a flush inserted or renamed, whose
+  stakeholders changed, or one of whose stakeholders changed email
+  """
+  subscription_ids = set()
+  user_ids = []
+  for obj in list(session.new) + list(session.dirty):
+    if isinstance(obj, Subscription) and (
+        obj in session.new or
+        changed(obj, 'subscription_name', 'users')):
+      subscription_ids.add(obj.id)
+    elif (isinstance(obj, User) and obj not in session.new and
+          changed(obj, 'email')):
+      user_ids.append(obj.id)
+  deleted = [obj.id for obj in session.deleted
+             if isinstance(obj, Subscription)]
+  if not (subscription_ids or user_ids or deleted):
+    return
+  connection = session.connection()
+  if user_ids:
+    subscription_ids.update(connection.execute(
+      select(user_subscriptions.c.subscription_id).where(
+        user_subscriptions.c.user_id.in_(user_ids))).scalars())
+  if deleted:
+    connection.execute(subscription_trigrams.delete().where(
+      subscription_trigrams.c.subscription_id.in_(deleted)))
+  index_subscriptions(connection, subscription_ids - set(deleted))
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+"""Counts of subscriptions by creator, status and expiry bucket, kept up
+to date as subscriptions are written"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from models.base_model import Base
+from models.subscription import Subscription, as_datetime
+from sqlalchemy import (Column, String, Boolean, DateTime, Integer, Table,
+                        event, inspect, select)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+subscription_summary = Table('subscription_summary', Base.metadata,
+                             Column('created_by', String(60),
+                                    primary_key=True),
+                             Column('subscription_status', Boolean,
+                                    primary_key=True),
+                             Column('bucket', String(16), primary_key=True),
+                             Column('count', Integer, nullable=False),
+                             Column('as_of', DateTime, nullable=False))
+
+# Expiry buckets: (name, expiring before N days after the as_of date).
+# The last bucket holds every later expiry.
+expiry_buckets = [('expired', 0),
+                  ('within_30', 31),
+                  ('within_60', 61),
+                  ('within_90', 91),
+                  ('later', None)]
+
+
+def bucket_bounds(as_of):
+  """Gets the (name, upper bound) of each expiry bucket on a date"""
+  return [(name, as_of + timedelta(days=days) if days is not None else None)
+          for name, days in expiry_buckets]
+
+
+def expiry_bucket(expiry_date, as_of):
+  """Gets the name of the expiry bucket of a date"""
+  expiry_date = as_datetime(expiry_date)
+  for name, bound in bucket_bounds(as_of):
+    if bound is None or expiry_date < bound:
+      return name
+
+
+def summary_key(created_by, status, expiry_date, as_of):
+  """Gets the summary row a subscription counts in"""
+  return (created_by, True if status is None else bool(status),
+          expiry_bucket(expiry_date, as_of))
+
+
+def today():
+  """Gets the as_of date a rebuilt summary gets"""
+  return datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+
+def get_as_of(connection):
+  """Gets the date the summary was last rebuilt on, None if never"""
+  return connection.execute(
+    select(subscription_summary.c.as_of).limit(1)).scalar()
+
+
+def upsert_count(connection, created_by, status, bucket, delta, as_of):
+  """Adds delta to a summary count, creating its row if needed in the
+  same statement, so that two transactions adding the first
+  subscription of a key do not both insert it
+  """
+  values = {'created_by': created_by, 'subscription_status': status,
+            'bucket': bucket, 'count': delta, 'as_of': as_of}
+  count = subscription_summary.c.count + delta
+  # each dialect is imported only when its database is in use
+  if connection.dialect.name == 'mysql':
+    from sqlalchemy.dialects import mysql
+    connection.execute(mysql.insert(subscription_summary).values(
+      values).on_duplicate_key_update(count=count))
+  elif connection.dialect.name == 'sqlite':
+    from sqlalchemy.dialects import sqlite
+    connection.execute(sqlite.insert(subscription_summary).values(
+      values).on_conflict_do_update(
+        index_elements=list(subscription_summary.primary_key),
+        set_={'count': count}))
+  else:
+    key = ((subscription_summary.c.created_by == created_by) &
+           (subscription_summary.c.subscription_status == status) &
+           (subscription_summary.c.bucket == bucket))
+    update = subscription_summary.update().where(key).values(count=count)
+    if connection.execute(update).rowcount:
+      return
+    try:
+      with connection.begin_nested():
+        connection.execute(subscription_summary.insert().values(values))
+    except IntegrityError:
+      # another transaction inserted the row first
+      connection.execute(update)
+
+
+def apply_changes(connection, changes, as_of):
+  """Adds a Counter of (created_by, subscription_status, bucket) keys
+  to the summary counts
+  """
+  for (created_by, status, bucket), delta in changes.items():
+    if delta != 0:
+      upsert_count(connection, created_by, status, bucket, delta, as_of)
+
+
+def count_mappings(mappings, as_of):
+  """Counts subscription mappings by summary key, for bulk inserts"""
+  return Counter(summary_key(mapping['created_by'],
+                             mapping.get('subscription_status'),
+                             mapping['expiry_date'], as_of)
+                 for mapping in mappings)
+
+
+def summarize(rows):
+  """Turns summary rows into the totals the dashboard shows"""
+  summary = {'as_of': None, 'total': 0, 'active': 0, 'inactive': 0,
+             'expiry': {name: 0 for name, _ in expiry_buckets},
+             'by_creator': {}}
+  for created_by, status, bucket, count, as_of in rows:
+    summary['as_of'] = as_of.date().isoformat()
+    summary['total'] += count
+    summary['active' if status else 'inactive'] += count
+    summary['expiry'][bucket] = summary['expiry'].get(bucket, 0) + count
+    summary['by_creator'][created_by] = summary['by_creator'].get(
+      created_by, 0) + count
+  expiring = 0
+  summary['expiring_within'] = {}
+  for name, days in expiry_buckets[1:-1]:
+    expiring += summary['expiry'][name]
+    summary['expiring_within'][str(days - 1)] = expiring
+  return summary
+
+
+def old_value(state, name):
+  """Gets the value a column had when the object was loaded"""
+  history = state.attrs[name].history
+  if history.deleted:
+    return history.deleted[0]
+  if history.unchanged:
+    return history.unchanged[0]
+  return getattr(state.object, name)
+
+
+@event.listens_for(Session, "after_flush")
+def update_summary(session, flush_context):
+  """Applies the subscriptions a flush inserted, updated or deleted to
+  the summary, in the same transaction. Nothing is done until the
+  summary was first built.
+  """
+  new = [obj for obj in session.new if isinstance(obj, Subscription)]
+  deleted = [obj for obj in session.deleted if isinstance(obj, Subscription)]
+  dirty = [obj for obj in session.dirty if isinstance(obj, Subscription) and
+           any(inspect(obj).attrs[name].history.has_changes()
+               for name in ('created_by', 'subscription_status',
+                            'expiry_date'))]
+  if not (new or deleted or dirty):
+    return
+  connection = session.connection()
+  as_of = get_as_of(connection)
+  if as_of is None:
+    return
+  changes = Counter()
+  for obj in new + dirty:
+    changes[summary_key(obj.created_by, obj.subscription_status,
+                        obj.expiry_date, as_of)] += 1
+  for obj in dirty + deleted:
+    state = inspect(obj)
+    changes[summary_key(old_value(state, 'created_by'),
+                        old_value(state, 'subscription_status'),
+                        old_value(state, 'expiry_date'), as_of)] -= 1
+  apply_changes(connection, changes, as_of)
@@ -3,6 +3,7 @@
 
 from models.base_model import BaseModel, Base
 from models.subscription import Subscription
+from models.serializer import Serializer
 from sqlalchemy import Column, String, Table, ForeignKey
 
 class User(BaseModel, Base):
@@ -10,7 +11,11 @@ class User(BaseModel, Base):
   __tablename__ = 'users'
   first_name = Column(String(128), nullable=False)
   last_name =  Column(String(128), nullable=False)
-  email =  Column(String(128), nullable=False)
+  email =  Column(String(128), nullable=False, unique=True, index=True)
+  serializer = Serializer(['id', 'created_at', 'updated_at', 'email',
+                           'first_name', 'last_name'],
+                          constants={'__class__': 'User'})
+  response_serializer = Serializer(['email', 'first_name', 'last_name', 'id'])
   
   def __init__(self, *args, **kwargs):
     "Iinitializes user"
@@ -18,12 +23,7 @@ class User(BaseModel, Base):
   
   def make_user_response(self):
     """Makes user response for front-end"""
-    user_dict = self.to_dict()
-    keys = ['email', 'first_name', 'last_name', 'id']
-    for key in user_dict.keys():
-      if key not in keys:
-        del user_dict[key]
-    return user_dict
+    return self.response_serializer.dump(self)
     # print("New User successfully created")
   
   # def create_subscription(self, *args, **kwargs):
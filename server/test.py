@@ -11,7 +11,7 @@ new_user = User(first_name="Justin",
                 email="justinoghenekomebedi@gmail.com")
 
 print(new_user)
-db.reload()
+db.create_all()
 db.new(new_user)
 db.save()
 new_sub = new_user.create_subscription(subscription_name="Data subcription",
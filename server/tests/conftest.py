@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+""" Fixtures of the API tests. The models read their settings when they
+are imported, so the environment is set up first: a primary and a read
+replica SQLite database in a temporary directory, Celery tasks run
+eagerly, reminders are kept in memory, metrics are shared through files
+like under gunicorn and logs go to the temporary directory instead of
+app.log.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+directory = tempfile.mkdtemp(prefix="subscription-tracker-")
+primary_path = os.path.join(directory, "primary.db")
+replica_path = os.path.join(directory, "replica.db")
+metrics_path = os.path.join(directory, "metrics")
+os.mkdir(metrics_path)
+os.environ.update({
+  "DATABASE_URL": "sqlite:///" + primary_path,
+  "DB_REPLICA_URL": "sqlite:///" + replica_path,
+  "ENABLE_SWAGGER": "0",
+  "ENABLE_CELERY": "1",
+  "CELERY_ALWAYS_EAGER": "1",
+  "CELERY_BROKER_URL": "memory://",
+  "CELERY_RESULT_BACKEND": "cache+memory://",
+  "EMAIL_BACKEND": "memory",
+  "EMAIL_RETRY_DELAY": "0",
+  "RESPONSE_CACHE": "off",
+  "USER_CACHE_TTL": "0",
+  "PROMETHEUS_MULTIPROC_DIR": metrics_path,
+})
+# api.v1.app logs to app.log unless logging is configured already
+logging.basicConfig(filename=os.path.join(directory, "app.log"),
+                    level=logging.DEBUG)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+  __file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from models import storage  # noqa: E402
+from models.base_model import Base  # noqa: E402
+from models.subscription import Subscription  # noqa: E402
+from models.user import User  # noqa: E402
+from api.v1.app import create_app  # noqa: E402
+
+
+def replicate():
+  """ Copies the primary database to the replica, like a replica
+  catching up
+  """
+  source = sqlite3.connect(primary_path)
+  target = sqlite3.connect(replica_path)
+  try:
+    source.backup(target)
+  finally:
+    source.close()
+    target.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+  """ The Flask app, with the tables created on both databases """
+  app = create_app()
+  storage.create_all()
+  replicate()
+  return app
+
+
+@pytest.fixture(autouse=True)
+def clean(app):
+  """ Empties every table of both databases after a test """
+  yield
+  storage.close()
+  connection = sqlite3.connect(primary_path)
+  try:
+    for table in reversed(Base.metadata.sorted_tables):
+      connection.execute("DELETE FROM {}".format(table.name))
+    connection.commit()
+  finally:
+    connection.close()
+  replicate()
+
+
+@pytest.fixture
+def client(app):
+  """ A test client of the app """
+  return app.test_client()
+
+
+@pytest.fixture
+def replica():
+  """ The function copying the primary database to the replica """
+  return replicate
+
+
+class QueryCounter:
+  """ Counts the SQL statements run on every engine """
+
+  def __init__(self):
+    """ Instantiate a QueryCounter, counting from zero """
+    self.statements = []
+
+  def __call__(self, conn, cursor, statement, *args):
+    """ Records a statement """
+    self.statements.append(statement)
+
+  @property
+  def count(self):
+    """ Number of statements run so far """
+    return len(self.statements)
+
+
+@pytest.fixture
+def queries():
+  """ Counts the SQL statements run during a test """
+  counter = QueryCounter()
+  event.listen(Engine, "before_cursor_execute", counter)
+  yield counter
+  event.remove(Engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture
+def make_user():
+  """ Creates users on the primary """
+  def make_user(email, first_name="Ada", last_name="Obi"):
+    user = User(first_name=first_name, last_name=last_name, email=email)
+    storage.new(user)
+    storage.save()
+    return user
+  return make_user
+
+
+@pytest.fixture
+def make_subscription():
+  """ Creates subscriptions on the primary, expiring in days days """
+  def make_subscription(creator, stakeholders, name="Office 365", days=10,
+                        **kwargs):
+    subscription = Subscription(
+      creator, subscription_name=name, users=" ".join(stakeholders),
+      expiry_date=datetime.utcnow() + timedelta(days=days), **kwargs)
+    storage.new(subscription)
+    storage.save()
+    return subscription
+  return make_subscription
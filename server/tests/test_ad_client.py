@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+""" Tests of the AD service client, against a stub AD service """
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pytest
+from api.v1.ad_client import (ADClient, ADServiceError, CircuitBreaker,
+                              CircuitOpenError)
+from api.v1.views import users
+
+
+class StubAD:
+  """ AD service answering with status, counting the calls it got """
+
+  def __init__(self):
+    """ Starts the stub on a free port """
+    self.status = 200
+    self.calls = 0
+    stub = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_POST(self):
+        form = parse_qs(self.rfile.read(
+          int(self.headers["Content-Length"])).decode())
+        stub.calls += 1
+        username = form["username"][0]
+        if stub.status == 200:
+          answer = {"status_code": "200", "data": {
+            "mail": username + "@aedc.test", "firstname": "Ada",
+            "surname": "Obi"}}
+        else:
+          answer = {"status_code": str(stub.status), "msg": "Unavailable"}
+        body = json.dumps(answer).encode()
+        self.send_response(stub.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, *args):
+        pass
+
+    self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    self.url = "http://127.0.0.1:{}/auth".format(self.server.server_port)
+
+  def close(self):
+    """ Stops the stub """
+    self.server.shutdown()
+    self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+  """ A stub AD service answering 200 """
+  stub = StubAD()
+  yield stub
+  stub.close()
+
+
+def client_of(stub, cache_ttl=0):
+  """ An ADClient of the stub that does not retry, and opens its
+  circuit after 2 failures for 0.2 seconds
+  """
+  return ADClient(stub.url, retries=0, cache_ttl=cache_ttl,
+                  breaker=CircuitBreaker(2, 0.2))
+
+
+def test_breaker_opens_half_opens_and_closes(stub):
+  """ Failures in a row open the circuit, which fails calls fast until
+  a trial call after reset_timeout succeeds
+  """
+  ad = client_of(stub)
+  credentials = {"username": "ada", "password": "secret"}
+  stub.status = 503
+  for _ in range(2):
+    assert ad.authenticate(credentials)["status_code"] == "503"
+  with pytest.raises(CircuitOpenError):
+    ad.authenticate(credentials)
+  assert stub.calls == 2
+
+  time.sleep(0.25)
+  stub.status = 200
+  ad.breaker.before_call()
+  # only the trial call goes through while the circuit is half open
+  with pytest.raises(CircuitOpenError):
+    ad.authenticate(credentials)
+  ad.breaker.record_success()
+  assert ad.authenticate(credentials)["status_code"] == "200"
+  assert (ad.breaker.failures, ad.breaker.opened_at) == (0, None)
+  assert stub.calls == 3
+
+
+def test_failed_trial_reopens(stub):
+  """ A trial call that fails opens the circuit for reset_timeout again """
+  ad = client_of(stub)
+  credentials = {"username": "ada", "password": "secret"}
+  stub.status = 500
+  for _ in range(2):
+    ad.authenticate(credentials)
+  time.sleep(0.25)
+  assert ad.authenticate(credentials)["status_code"] == "500"
+  with pytest.raises(CircuitOpenError):
+    ad.authenticate(credentials)
+  assert stub.calls == 3
+
+
+def test_unreachable_service_counts_as_a_failure(stub):
+  """ Connection errors raise ADServiceError and open the circuit """
+  ad = client_of(stub)
+  stub.close()
+  for _ in range(2):
+    with pytest.raises(ADServiceError) as info:
+      ad.authenticate({"username": "ada", "password": "secret"})
+    assert not isinstance(info.value, CircuitOpenError)
+  with pytest.raises(CircuitOpenError):
+    ad.authenticate({"username": "ada", "password": "secret"})
+
+
+def test_cache_hit_skips_the_service(stub):
+  """ Successful answers are reused for the same credentials only, and
+  failed ones are not cached
+  """
+  ad = client_of(stub, cache_ttl=60)
+  credentials = {"username": "ada", "password": "secret"}
+  first = ad.authenticate(credentials)
+  assert ad.authenticate(dict(credentials)) == first
+  assert stub.calls == 1
+  ad.authenticate({"username": "ada", "password": "other"})
+  assert stub.calls == 2
+
+  stub.status = 503
+  credentials = {"username": "obi", "password": "secret"}
+  ad.authenticate(credentials)
+  ad.authenticate(credentials)
+  assert stub.calls == 4
+
+
+def test_login_with_an_open_circuit(client, stub, monkeypatch):
+  """ POST /api/v1/users answers 503 while the circuit is open, and
+  logs users in again once the AD service is back
+  """
+  ad = client_of(stub)
+  monkeypatch.setattr(users, "ad_client", ad)
+  credentials = {"username": "ada", "password": "secret"}
+  stub.status = 503
+  for _ in range(2):
+    client.post("/api/v1/users", json=credentials)
+  response = client.post("/api/v1/users", json=credentials)
+  assert response.status_code == 503
+  assert stub.calls == 2
+  time.sleep(0.25)
+  stub.status = 200
+  response = client.post("/api/v1/users", json=credentials)
+  assert response.status_code in (200, 201)
+  assert response.get_json()["email"] == "ada@aedc.test"
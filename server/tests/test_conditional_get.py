@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+""" Tests of the ETag and Last-Modified handling of GET endpoints """
+import time
+from datetime import datetime, timedelta
+import pytest
+from models import storage
+from models.subscription import Subscription
+
+read_your_writes = {"X-Read-Your-Writes": "1"}
+
+
+def test_reminder_changes_the_etag(client, make_user, make_subscription):
+  """ A subscription is modified once a reminder was sent for it """
+  creator = make_user("creator@aedc.test")
+  subscription = make_subscription(creator, [creator.email])
+  path = "/api/v1/subscriptions/" + subscription.id
+  etag = client.get(path, headers=read_your_writes).headers["ETag"]
+  storage.mark_notified([subscription], datetime.utcnow())
+  response = client.get(path, headers=dict(read_your_writes,
+                                           **{"If-None-Match": etag}))
+  assert response.status_code == 200
+  assert response.get_json()["last_notification"] is not None
+
+
+def test_lists_ignore_if_modified_since(client, make_user,
+                                        make_subscription):
+  """ A list has no Last-Modified, so a delete cannot go unnoticed """
+  creator = make_user("creator@aedc.test")
+  make_subscription(creator, [creator.email])
+  gone = make_subscription(creator, [creator.email], days=20)
+  path = "/api/v1/subscriptions"
+  response = client.get(path, headers=read_your_writes)
+  assert "Last-Modified" not in response.headers
+  storage.delete(storage.get(Subscription, gone.id))
+  storage.save()
+  response = client.get(path, headers=dict(read_your_writes, **{
+    "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}))
+  assert response.status_code == 200
+  assert len(response.get_json()) == 1
+
+
+@pytest.fixture
+def lagos_time(monkeypatch):
+  """ Runs the test with the local time one hour ahead of UTC """
+  monkeypatch.setenv("TZ", "Africa/Lagos")
+  time.tzset()
+  yield
+  monkeypatch.undo()
+  time.tzset()
+
+
+def test_last_modified_is_utc(client, make_user, make_subscription,
+                              lagos_time):
+  """ updated_at is local time, Last-Modified gives it in UTC """
+  creator = make_user("creator@aedc.test")
+  subscription = make_subscription(creator, [creator.email])
+  response = client.get("/api/v1/subscriptions/" + subscription.id,
+                        headers=read_your_writes)
+  last_modified = response.last_modified.replace(tzinfo=None)
+  assert abs(datetime.utcnow() - last_modified) < timedelta(minutes=1)
+
+
+def test_weak_etag_matches(client, make_user, make_subscription):
+  """ An ETag weakened on the way, e.g. by a compressing proxy, still
+  gets a 304
+  """
+  creator = make_user("creator@aedc.test")
+  subscription = make_subscription(creator, [creator.email])
+  path = "/api/v1/subscriptions/" + subscription.id
+  etag = client.get(path, headers=read_your_writes).headers["ETag"]
+  response = client.get(path, headers=dict(read_your_writes, **{
+    "If-None-Match": "W/" + etag}))
+  assert response.status_code == 304
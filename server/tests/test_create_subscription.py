@@ -0,0 +1,21 @@
+#!/usr/bin/python3
+""" Tests of POST /api/v1/subscriptions/<user_id> """
+from models import storage
+from models.subscription import Subscription
+
+
+def test_unknown_stakeholder_emails_are_rejected(client, make_user):
+  """ A subscription naming unknown stakeholders is not created, and the
+  error lists the unknown emails
+  """
+  creator = make_user("creator@aedc.test")
+  response = client.post("/api/v1/subscriptions/" + creator.id, json={
+    "subscription_name": "Office 365",
+    "start_date": "2026-01-01T00:00:00",
+    "expiry_date": "2027-01-01T00:00:00",
+    "users": "creator@aedc.test ghost@aedc.test nobody@aedc.test"})
+  assert response.status_code == 400
+  assert ("Unknown stakeholder emails: ghost@aedc.test nobody@aedc.test"
+          in response.get_data(as_text=True))
+  storage.close()
+  assert storage.all(Subscription) == {}
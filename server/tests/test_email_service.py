@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+""" Tests of the reminder sweep, run by eager Celery tasks """
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from api.v1 import email_service
+from api.v1.email_transport import MemoryTransport, get_transport
+from models import storage
+from models.dead_letter import DeadLetter
+from models.notification_run import NotificationRun
+from models.subscription import Subscription
+
+
+def test_sweep_fans_out_in_chunks(app, make_user, make_subscription,
+                                  monkeypatch):
+  """ Due subscriptions are split into chunks whose counts add up in
+  the NotificationRun, and each gets one reminder
+  """
+  monkeypatch.setattr(email_service, "chunk_size", 3)
+  monkeypatch.setattr(email_service, "batch_size", 2)
+  creator = make_user("creator@aedc.test")
+  make_user("stakeholder@aedc.test")
+  for day in range(7):
+    make_subscription(creator, ["stakeholder@aedc.test"], days=day + 1)
+  outbox = get_transport().outbox
+  sent_before = len(outbox)
+
+  result = email_service.send_email_task.delay().get()
+
+  assert result["chunks"] == 3
+  storage.close()
+  run = storage.get(NotificationRun, result["run"])
+  assert run.status == "done"
+  assert (run.chunks, run.scanned, run.due, run.sent, run.failed) == (
+    3, 7, 7, 7, 0)
+  assert len(outbox) - sent_before == 7
+  subscriptions = storage.all(Subscription).values()
+  assert all(subscription.last_notification is not None
+             for subscription in subscriptions)
+
+
+def test_sweep_without_due_subscriptions(app):
+  """ A sweep with nothing due is recorded as done without chunks """
+  result = email_service.send_email_task.delay().get()
+  assert result["chunks"] == 0
+  run = storage.get(NotificationRun, result["run"])
+  assert (run.status, run.scanned) == ("done", 0)
+
+
+def test_digest_sweep(app, make_user, make_subscription, monkeypatch):
+  """ A digest sweep sends each stakeholder one message, and is only
+  recorded when reminders were due
+  """
+  monkeypatch.setattr(email_service, "notification_mode", "digest")
+  assert email_service.send_email_task.delay().get() == {"run": None,
+                                                         "chunks": 0}
+  assert storage.get_notification_runs(1) == []
+  creator = make_user("creator@aedc.test")
+  make_user("stakeholder@aedc.test")
+  for day in range(3):
+    make_subscription(creator, ["creator@aedc.test",
+                                "stakeholder@aedc.test"], days=day + 1)
+  outbox = get_transport().outbox
+  sent_before = len(outbox)
+
+  result = email_service.send_email_task.delay().get()
+
+  assert len(outbox) - sent_before == 2
+  run = storage.get(NotificationRun, result["run"])
+  assert (run.status, run.scanned, run.sent) == ("done", 3, 3)
+
+
+def test_refused_digest_is_dead_lettered_per_subscription(
+    app, make_user, make_subscription, monkeypatch):
+  """ A digest refused for good gives one DeadLetter for each of the
+  subscriptions it lists, which are notified through the stakeholders
+  that accepted theirs
+  """
+  class RefusingTransport(MemoryTransport):
+    def send(self, message, recipients=None):
+      super().send(message, recipients)
+      return {recipient: (550, b"Mailbox unavailable")
+              for recipient in recipients
+              if recipient == "gone@aedc.test"}
+
+  monkeypatch.setattr(email_service, "notification_mode", "digest")
+  monkeypatch.setattr(email_service, "get_transport", RefusingTransport)
+  creator = make_user("creator@aedc.test")
+  make_user("gone@aedc.test")
+  shared = make_subscription(creator, ["creator@aedc.test",
+                                       "gone@aedc.test"], days=1)
+  alone = make_subscription(creator, ["gone@aedc.test"], days=2)
+
+  result = email_service.send_email_task.delay().get()
+
+  storage.close()
+  dead_letters = storage.all(DeadLetter).values()
+  assert sorted(dead_letter.subscription_id
+                for dead_letter in dead_letters) == sorted([shared.id,
+                                                            alone.id])
+  assert all((dead_letter.recipient, dead_letter.error,
+              dead_letter.attempts) == ("gone@aedc.test",
+                                        "550 Mailbox unavailable", 1)
+             for dead_letter in dead_letters)
+  run = storage.get(NotificationRun, result["run"])
+  assert (run.scanned, run.sent) == (2, 1)
+
+
+def test_record_sent_commits_once(app, make_user, make_subscription):
+  """ Notified and postponed subscriptions are updated in one commit """
+  creator = make_user("creator@aedc.test")
+  notified = make_subscription(creator, ["creator@aedc.test"], days=1)
+  failed = make_subscription(creator, ["creator@aedc.test"], days=2)
+  commits = []
+  count_commit = commits.append
+  event.listen(Engine, "commit", count_commit)
+  now = datetime.utcnow()
+  try:
+    email_service.record_sent([notified, failed], {notified.id}, now,
+                              email_service.new_stats())
+  finally:
+    event.remove(Engine, "commit", count_commit)
+  assert len(commits) == 1
+  storage.close()
+  assert storage.get(Subscription, notified.id).last_notification == now
+  assert storage.get(Subscription, failed.id).next_notification_at == (
+    now + timedelta(seconds=email_service.retry_interval))
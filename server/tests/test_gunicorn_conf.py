@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+""" Tests of the gunicorn settings """
+import multiprocessing
+import os
+import runpy
+import pytest
+
+conf = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+  __file__))), "gunicorn.conf.py")
+
+
+def test_empty_settings_take_their_default(monkeypatch):
+  """ Settings exported empty from .env.example do not stop gunicorn """
+  for name in ("GUNICORN_BIND", "GUNICORN_WORKERS", "GUNICORN_THREADS",
+               "GUNICORN_TIMEOUT"):
+    monkeypatch.setenv(name, "")
+  settings = runpy.run_path(conf)
+  assert settings["bind"] == "0.0.0.0:5000"
+  assert settings["workers"] == multiprocessing.cpu_count() * 2 + 1
+  assert (settings["threads"], settings["timeout"]) == (4, 30)
+
+
+def test_memory_cache_needs_one_worker(monkeypatch):
+  """ The per process response cache is refused with several workers """
+  monkeypatch.setenv("RESPONSE_CACHE", "memory")
+  monkeypatch.setenv("GUNICORN_WORKERS", "2")
+  with pytest.raises(ValueError):
+    runpy.run_path(conf)
+  monkeypatch.setenv("GUNICORN_WORKERS", "1")
+  assert runpy.run_path(conf)["workers"] == 1
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+""" Tests of GET /api/v1/metrics """
+import os
+import subprocess
+import sys
+
+status_count = ('http_request_duration_seconds_count{endpoint='
+                '"app_views.status",method="GET",status="200"}')
+
+
+def scrape(client):
+  """ Gets the metrics as a dict of sample to value """
+  response = client.get("/api/v1/metrics")
+  assert response.status_code == 200
+  samples = {}
+  for line in response.get_data(as_text=True).splitlines():
+    if line and not line.startswith("#"):
+      name, value = line.rsplit(" ", 1)
+      samples[name] = float(value)
+  return samples
+
+
+def test_request_is_counted(client):
+  """ A request shows up in the next scrape, with its SQL statements """
+  before = scrape(client).get(status_count, 0)
+  assert client.get("/api/v1/status").status_code == 200
+  samples = scrape(client)
+  assert samples[status_count] == before + 1
+  assert ('http_request_sql_queries_count{endpoint="app_views.status",'
+          'method="GET",status="200"}') in samples
+  assert 'notification_runs_total{status="done"}' not in samples
+
+
+def test_requests_of_other_processes_are_added(client):
+  """ Samples written by another worker process are in the scrape """
+  before = scrape(client).get(status_count, 0)
+  server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  subprocess.run([sys.executable, "-c",
+                  "from api.v1.metrics import metrics; "
+                  "metrics.record(('app_views.status', 'GET', 200), "
+                  "0.1, 3, 0.01)"], cwd=server_dir, check=True,
+                 env=dict(os.environ, PYTHONPATH=server_dir))
+  assert client.get("/api/v1/status").status_code == 200
+  assert scrape(client)[status_count] == before + 2
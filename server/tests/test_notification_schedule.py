@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+""" Tests of next_notification_at against the tier rules the sweep used
+to apply to every subscription
+"""
+import random
+from datetime import datetime, timedelta
+from models import storage
+from models.subscription import (Subscription, next_notification_time,
+                                 notification_tiers)
+
+read_your_writes = {"X-Read-Your-Writes": "1"}
+start = datetime(2024, 1, 1)
+
+
+def was_due(expiry_date, last_notification, now):
+  """ The condition the sweep matched due subscriptions with before
+  next_notification_at was stored
+  """
+  if last_notification is None:
+    return True
+  for above, up_to, cadence in notification_tiers:
+    if (last_notification <= now - timedelta(days=cadence) and
+        (above is None or expiry_date > now + timedelta(days=above)) and
+        (up_to is None or expiry_date <= now + timedelta(days=up_to))):
+      return True
+  return False
+
+
+def is_due(expiry_date, last_notification, now):
+  """ The condition the scheduler matches due subscriptions with """
+  return next_notification_time(expiry_date, last_notification,
+                                now) <= now
+
+
+def test_random_cases_agree():
+  """ Both conditions agree on random expiry, reminder and sweep times """
+  generator = random.Random(21)
+  for _ in range(20000):
+    last_notification = start + timedelta(
+      seconds=generator.randrange(400 * 86400))
+    expiry_date = last_notification + timedelta(
+      seconds=generator.randrange(-30 * 86400, 200 * 86400))
+    now = last_notification + timedelta(
+      seconds=generator.randrange(60 * 86400))
+    assert is_due(expiry_date, last_notification, now) == was_due(
+      expiry_date, last_notification, now), (expiry_date, last_notification,
+                                             now)
+
+
+def test_tier_boundaries_agree():
+  """ Both conditions agree exactly on the edges of the tiers, and of
+  the 30, 7, 3.5 and 1 day cadences
+  """
+  edges = [timedelta(days=days) + timedelta(seconds=offset)
+           for days in (0, 1, 3.5, 7, 30, 60, 90)
+           for offset in (-1, 0, 1)]
+  now = datetime(2024, 6, 1)
+  for to_expiry in edges:
+    for since_last in edges:
+      expiry_date = now + to_expiry
+      last_notification = now - since_last
+      assert is_due(expiry_date, last_notification, now) == was_due(
+        expiry_date, last_notification, now), (to_expiry, since_last)
+  assert is_due(now + timedelta(days=91), None, now)
+
+
+def test_put_expiry_date_reschedules(client, make_user, make_subscription):
+  """ Moving the expiry date of a notified subscription through the API
+  moves its next reminder to the cadence of its new tier
+  """
+  creator = make_user("creator@aedc.test")
+  subscription = make_subscription(creator, [creator.email], days=120)
+  notified_at = datetime.utcnow().replace(microsecond=0)
+  storage.mark_notified([subscription], notified_at)
+  storage.close()
+  assert storage.get(Subscription, subscription.id).next_notification_at == (
+    notified_at + timedelta(days=30))
+
+  expiry_date = notified_at + timedelta(days=20)
+  response = client.put("/api/v1/subscriptions/" + subscription.id,
+                        json={"expiry_date": expiry_date.isoformat()})
+  assert response.status_code == 200
+  storage.close()
+  next_at = storage.get(Subscription, subscription.id).next_notification_at
+  assert next_at == notified_at + timedelta(days=1)
+  for hours in (23, 24, 25):
+    now = notified_at + timedelta(hours=hours)
+    assert (next_at <= now) == was_due(expiry_date, notified_at, now)
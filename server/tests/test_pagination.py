@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+""" Tests of the keyset pagination of the list endpoints """
+from datetime import datetime
+from models import storage
+from models.user import User
+
+read_your_writes = {"X-Read-Your-Writes": "1"}
+
+
+def add_users(count, created_at=None):
+  """ Adds count users, all created at created_at when given """
+  for number in range(count):
+    user = User(first_name="Ada", last_name="Obi",
+                email="user{}@aedc.test".format(number))
+    if created_at is not None:
+      user.created_at = created_at
+    storage.new(user)
+  storage.save()
+  storage.close()
+
+
+def pages(client, path, limit):
+  """ Follows X-Next-Cursor from the first page to the last, returns
+  the pages
+  """
+  result = []
+  cursor = None
+  while True:
+    query = "{}?limit={}".format(path, limit)
+    if cursor is not None:
+      query += "&cursor=" + cursor
+    response = client.get(query, headers=read_your_writes)
+    assert response.status_code == 200
+    result.append(response.get_json())
+    cursor = response.headers.get("X-Next-Cursor")
+    if cursor is None:
+      return result
+
+
+def test_ties_across_a_page_boundary(client):
+  """ Users created at the same time are each listed once, even when
+  the tie spans several pages
+  """
+  add_users(7, created_at=datetime(2024, 5, 1, 12, 0, 0))
+  listed = [user["id"] for page in pages(client, "/api/v1/users", 3)
+            for user in page]
+  assert len(listed) == 7
+  assert sorted(listed) == sorted(user.id for user in
+                                  storage.all(User).values())
+  assert listed == sorted(listed)
+
+
+def test_last_page_has_no_cursor(client):
+  """ The last page has no X-Next-Cursor, also when it is full, so no
+  empty page is ever fetched
+  """
+  add_users(4)
+  assert [len(page) for page in pages(client, "/api/v1/users", 2)] == [2, 2]
+  assert [len(page) for page in pages(client, "/api/v1/users", 3)] == [3, 1]
+  assert [len(page) for page in pages(client, "/api/v1/users", 5)] == [4]
+
+
+def test_malformed_cursor(client):
+  """ A cursor that was not made by the server is a 400 """
+  for cursor in ("nonsense", "bm9uc2Vuc2U=", "WzEsIDJd", "W10="):
+    response = client.get("/api/v1/users?cursor=" + cursor,
+                          headers=read_your_writes)
+    assert response.status_code == 400
+    response = client.get("/api/v1/subscriptions?cursor=" + cursor,
+                          headers=read_your_writes)
+    assert response.status_code == 400
+
+
+def test_limit_clamping(client):
+  """ limit defaults to 100, is capped at 1000, and must be a positive
+  integer
+  """
+  add_users(1005)
+  assert [len(page) for page in pages(client, "/api/v1/users", 5000)] == [
+    1000, 5]
+  response = client.get("/api/v1/users", headers=read_your_writes)
+  assert len(response.get_json()) == 100
+  for limit in ("0", "-1", "ten"):
+    response = client.get("/api/v1/users?limit=" + limit,
+                          headers=read_your_writes)
+    assert response.status_code == 400
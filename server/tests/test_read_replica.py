@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+""" Tests of the routing of reads to the replica and writes to the
+primary
+"""
+
+
+def test_get_reads_the_replica(client, make_user, replica):
+  """ A GET does not see a write until the replica caught up with it,
+  unless it asks to read its own writes
+  """
+  user = make_user("ada@aedc.test")
+  path = "/api/v1/users/" + user.id
+  assert client.get(path).status_code == 404
+  response = client.get(path, headers={"X-Read-Your-Writes": "1"})
+  assert response.status_code == 200
+  replica()
+  assert client.get(path).status_code == 200
+
+
+def test_writes_go_to_the_primary(client, make_user, replica):
+  """ A PUT updates the primary, the replica keeps the old value until
+  it catches up
+  """
+  user = make_user("ada@aedc.test", first_name="Ada")
+  replica()
+  path = "/api/v1/users/" + user.id
+  response = client.put(path, json={"first_name": "Adaeze"})
+  assert response.status_code == 201
+  assert client.get(path).get_json()["first_name"] == "Ada"
+  response = client.get(path, headers={"X-Read-Your-Writes": "1"})
+  assert response.get_json()["first_name"] == "Adaeze"
+  replica()
+  assert client.get(path).get_json()["first_name"] == "Adaeze"
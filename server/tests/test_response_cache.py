@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+""" Tests of the response cache, on the in-process and Redis backends """
+import fakeredis
+import pytest
+import redis
+from api.v1.response_cache import (MemoryBackend, RedisBackend, make_backend,
+                                   response_cache)
+
+path = "/api/v1/subscriptions"
+read_your_writes = {"X-Read-Your-Writes": "1"}
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request, monkeypatch):
+  """ Turns the response cache on, with a fresh backend """
+  if request.param == "memory":
+    backend = MemoryBackend(128, 60)
+  else:
+    monkeypatch.setattr(redis, "Redis", fakeredis.FakeRedis)
+    backend = RedisBackend("redis://localhost:6379/0", 60)
+  monkeypatch.setattr(response_cache, "backend", backend)
+  for counter in ("hits", "misses", "errors"):
+    monkeypatch.setattr(response_cache, counter, 0)
+  return response_cache
+
+
+@pytest.fixture
+def creator(make_user):
+  """ The user creating the subscriptions, also their stakeholder """
+  return make_user("creator@aedc.test")
+
+
+def test_second_get_is_a_hit(client, cache, creator, make_subscription,
+                             replica):
+  """ The same GET is answered from the cache the second time """
+  make_subscription(creator, [creator.email])
+  replica()
+  first = client.get(path)
+  second = client.get(path)
+  assert second.status_code == 200
+  assert second.get_json() == first.get_json()
+  assert (cache.hits, cache.misses) == (1, 1)
+  assert client.get("/api/v1/status").get_json()["cache"]["hits"] == 1
+
+
+def test_commit_invalidates(client, cache, creator, make_subscription,
+                            replica):
+  """ A committed write drops the cached responses it affects """
+  make_subscription(creator, [creator.email])
+  replica()
+  assert len(client.get(path).get_json()) == 1
+  make_subscription(creator, [creator.email], days=20)
+  replica()
+  assert len(client.get(path).get_json()) == 2
+  assert cache.hits == 0
+
+
+def test_read_your_writes_bypasses_the_cache(client, cache, creator,
+                                             make_subscription):
+  """ A response read from a lagging replica after an invalidation is
+  never served to a client reading its own writes
+  """
+  make_subscription(creator, [creator.email])
+  # the replica has not caught up with the write
+  assert client.get(path).get_json() == []
+  assert client.get(path).get_json() == []
+  response = client.get(path, headers=read_your_writes)
+  assert len(response.get_json()) == 1
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_backend_needs_a_single_process(monkeypatch):
+  """ The memory backend is refused when a Celery worker also writes """
+  monkeypatch.setenv("RESPONSE_CACHE", "memory")
+  monkeypatch.setenv("ENABLE_CELERY", "1")
+  monkeypatch.setenv("CELERY_ALWAYS_EAGER", "0")
+  with pytest.raises(ValueError):
+    make_backend()
+  monkeypatch.setenv("CELERY_ALWAYS_EAGER", "1")
+  assert isinstance(make_backend(), MemoryBackend)
+  monkeypatch.setenv("ENABLE_CELERY", "0")
+  monkeypatch.setenv("CELERY_ALWAYS_EAGER", "0")
+  assert isinstance(make_backend(), MemoryBackend)
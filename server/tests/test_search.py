@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+""" Tests of GET /api/v1/subscriptions/search and of the trigram index
+it reads
+"""
+from models import storage
+from models.subscription import Subscription
+from models.subscription_search import subscription_trigrams
+from models.user import User
+from os import environ
+from sqlalchemy import create_engine, select
+
+read_your_writes = {"X-Read-Your-Writes": "1"}
+
+
+def search(client, text, limit=100, cursor=None):
+  """ Gets the names of the subscriptions found for text, and the cursor
+  of the next page
+  """
+  path = "/api/v1/subscriptions/search?q={}&limit={}".format(text, limit)
+  if cursor is not None:
+    path += "&cursor=" + cursor
+  response = client.get(path, headers=read_your_writes)
+  assert response.status_code == 200
+  return ([row["subscription_name"] for row in response.get_json()],
+          response.headers.get("X-Next-Cursor"))
+
+
+def index_rows():
+  """ Gets the (subscription id, trigram) rows of the index """
+  engine = create_engine(environ["DATABASE_URL"])
+  with engine.connect() as connection:
+    rows = sorted(connection.execute(select(
+      subscription_trigrams.c.subscription_id,
+      subscription_trigrams.c.trigram)))
+  engine.dispose()
+  return rows
+
+
+def assert_index_in_sync():
+  """ The index kept up to date on write is the one a rebuild gives """
+  storage.close()
+  kept = index_rows()
+  storage.reindex_search()
+  storage.close()
+  assert kept == index_rows()
+
+
+def test_ranking(client, make_user, make_subscription):
+  """ Exact names come first, then name prefixes, name substrings and
+  stakeholder emails, each by expiry date, whatever the case
+  """
+  creator = make_user("creator@aedc.test")
+  make_user("office.admin@aedc.test")
+  make_subscription(creator, [creator.email, "office.admin@aedc.test"],
+                    name="Zoom", days=1)
+  make_subscription(creator, [creator.email], name="Microsoft OFFICE",
+                    days=2)
+  make_subscription(creator, [creator.email], name="Office 365 E5", days=4)
+  make_subscription(creator, [creator.email], name="Office 365 E3", days=3)
+  make_subscription(creator, [creator.email], name="office", days=5)
+  make_subscription(creator, [creator.email], name="Slack", days=6)
+  storage.close()
+
+  names, cursor = search(client, "Office")
+  assert names == ["office", "Office 365 E3", "Office 365 E5",
+                   "Microsoft OFFICE", "Zoom"]
+  assert cursor is None
+  first, cursor = search(client, "office", limit=2)
+  second, cursor = search(client, "office", limit=2, cursor=cursor)
+  third, cursor = search(client, "office", limit=2, cursor=cursor)
+  assert first + second + third == names
+  assert cursor is None
+  assert search(client, "teams")[0] == []
+  response = client.get("/api/v1/subscriptions/search?q=of",
+                        headers=read_your_writes)
+  assert response.status_code == 400
+
+
+def test_index_follows_writes(client, make_user, make_subscription):
+  """ Inserts, renames, stakeholder and email changes, and deletes are
+  reflected in the index as a rebuild would
+  """
+  creator = make_user("creator@aedc.test")
+  stakeholder = make_user("ada@aedc.test")
+  subscription = make_subscription(creator, [creator.email],
+                                   name="Adobe Acrobat")
+  other = make_subscription(creator, [stakeholder.email], name="Zoom")
+  assert search(client, "acrobat")[0] == ["Adobe Acrobat"]
+  assert_index_in_sync()
+
+  subscription = storage.get(Subscription, subscription.id)
+  subscription.subscription_name = "Autodesk"
+  storage.save()
+  assert search(client, "acrobat")[0] == []
+  assert search(client, "autodesk")[0] == ["Autodesk"]
+  assert_index_in_sync()
+
+  subscription = storage.get(Subscription, subscription.id)
+  subscription.users.append(storage.get(User, stakeholder.id))
+  storage.save()
+  assert search(client, "ada@")[0] == ["Autodesk", "Zoom"]
+  assert_index_in_sync()
+
+  stakeholder = storage.get(User, stakeholder.id)
+  stakeholder.email = "adaeze@aedc.test"
+  storage.save()
+  assert search(client, "adaeze")[0] == ["Autodesk", "Zoom"]
+  assert_index_in_sync()
+
+  storage.delete(storage.get(Subscription, other.id))
+  storage.save()
+  assert search(client, "adaeze")[0] == ["Autodesk"]
+  assert other.id not in {id for id, _ in index_rows()}
+  assert_index_in_sync()
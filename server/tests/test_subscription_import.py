@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+""" Tests of POST /api/v1/subscriptions/<user_id>/import """
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from api.v1 import subscription_import
+from models import storage
+from models.subscription import Subscription
+from sqlalchemy.exc import IntegrityError
+
+header = "subscription_name,start_date,expiry_date,users\r\n"
+
+
+def csv_row(number, users="creator@aedc.test"):
+  """ A valid CSV line """
+  return "Licence {},2026-01-01,2027-01-01,{}\r\n".format(number, users)
+
+
+@pytest.fixture
+def creator(make_user):
+  """ The user importing the subscriptions """
+  return make_user("creator@aedc.test")
+
+
+def upload(client, creator, body, content_type="text/csv", **kwargs):
+  """ Posts an upload, returns the status code and JSON report """
+  response = client.post(
+    "/api/v1/subscriptions/{}/import".format(creator.id), data=body,
+    content_type=content_type, **kwargs)
+  return response.status_code, response.get_json()
+
+
+def imported_names():
+  """ Gets the names of the subscriptions in the database """
+  storage.close()
+  return sorted(subscription.subscription_name
+                for subscription in storage.all(Subscription).values())
+
+
+def test_csv_import(client, creator):
+  """ Valid rows are imported, invalid ones reported by row number """
+  body = (header + csv_row(1) + "Licence 2,2026-01-01,soon,"
+          "creator@aedc.test\r\n" + csv_row(3, "ghost@aedc.test"))
+  status, report = upload(client, creator, body.encode())
+  assert status == 200
+  assert report == {"imported": 1, "error_count": 2, "errors": [
+    {"row": 2, "error": "Invalid expiry_date"},
+    {"row": 3, "error": "Unknown stakeholder emails: ghost@aedc.test"}]}
+  assert imported_names() == ["Licence 1"]
+
+
+def test_csv_with_byte_order_mark(client, creator):
+  """ The byte order mark of Excel's CSV UTF-8 export is skipped """
+  body = "\ufeff" + header + csv_row(1) + csv_row(2)
+  status, report = upload(client, creator, body.encode())
+  assert (status, report["imported"], report["errors"]) == (200, 2, [])
+
+
+def test_file_that_is_not_utf8(client, creator, monkeypatch):
+  """ The chunks read before an invalid byte are imported, and the
+  report says where reading stopped
+  """
+  monkeypatch.setattr(subscription_import, "chunk_size", 2)
+  rows = "".join(csv_row(number) for number in range(1, 401))
+  body = (header + rows).encode() + "Caf\xe9,x,y,z\r\n".encode("cp1252")
+  status, report = upload(client, creator, body)
+  assert status == 200
+  assert 0 < report["imported"] < 400
+  assert report["errors"] == [{
+    "row": report["imported"] + 1,
+    "error": "Not valid UTF-8, the rest of the file was not read"}]
+  assert len(imported_names()) == report["imported"]
+
+
+def test_malformed_csv(client, creator):
+  """ A CSV field past the csv module's size limit stops the import
+  with an error instead of a 500
+  """
+  body = header + csv_row(1) + '"' + "x" * 200000 + '",a,b,c\r\n'
+  status, report = upload(client, creator, body.encode())
+  assert status == 200
+  assert report["imported"] == 1
+  assert report["errors"][0]["row"] == 2
+  assert report["errors"][0]["error"].startswith("Invalid CSV")
+
+
+def test_ndjson_import(client, creator):
+  """ NDJSON rows are imported, invalid lines reported """
+  lines = [json.dumps({"subscription_name": "Licence 1",
+                       "start_date": "2026-01-01",
+                       "expiry_date": "2027-01-01",
+                       "users": ["creator@aedc.test"]}),
+           "{not json", "[1, 2]"]
+  status, report = upload(client, creator, "\n".join(lines).encode(),
+                          content_type="application/x-ndjson")
+  assert status == 200
+  assert report["imported"] == 1
+  assert report["errors"] == [{"row": 2, "error": "Invalid JSON"},
+                              {"row": 3,
+                               "error": "Row is not a JSON object"}]
+
+
+def test_multipart_upload(client, creator):
+  """ The file can be sent as a multipart form field """
+  data = {"file": (io.BytesIO((header + csv_row(1)).encode()), "a.csv",
+                   "text/csv")}
+  status, report = upload(client, creator, data,
+                          content_type="multipart/form-data")
+  assert (status, report["imported"]) == (200, 1)
+
+
+def test_unknown_format_and_user(client, creator):
+  """ Uploads of another format, or for an unknown user, are refused """
+  assert upload(client, creator, b"x", content_type="text/plain")[0] == 400
+  response = client.post("/api/v1/subscriptions/nobody/import",
+                         data=header.encode(), content_type="text/csv")
+  assert response.status_code == 404
+
+
+def test_failed_batch_inserts_nothing(creator):
+  """ A batch whose stakeholder links fail leaves no subscription
+  behind, the subscriptions and links are committed together
+  """
+  now = datetime.utcnow()
+  link = {"user_id": creator.id, "subscription_id": "sub-1"}
+  with pytest.raises(IntegrityError):
+    storage.bulk_insert_subscriptions(
+      [{"id": "sub-1", "created_at": now, "updated_at": now,
+        "subscription_name": "Licence 1", "subscription_status": True,
+        "start_date": now, "expiry_date": now + timedelta(days=30),
+        "created_by": creator.id}], [link, link])
+  storage.close()
+  assert storage.get(Subscription, "sub-1") is None
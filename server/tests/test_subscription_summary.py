@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+""" Tests of the incrementally maintained subscription summary """
+import os
+import subprocess
+import sys
+from collections import Counter
+from os import environ
+from models import storage
+from models.subscription_summary import apply_changes, today
+from sqlalchemy import create_engine
+
+
+def summary_rows():
+  """ Gets the summary as a sorted list of (created_by, status, bucket,
+  count) tuples, leaving out counts down to zero
+  """
+  storage.close()
+  return sorted(row[:4] for row in storage.get_subscription_summary()
+                if row[3])
+
+
+def test_writes_keep_the_summary_in_step(make_user, make_subscription):
+  """ Inserts, updates and deletes give the counts of a full rebuild """
+  creator = make_user("creator@aedc.test")
+  other = make_user("other@aedc.test")
+  make_subscription(creator, [creator.email], days=10)
+  storage.rebuild_subscription_summary()
+  make_subscription(creator, [creator.email], days=10)
+  make_subscription(other, [other.email], days=45)
+  moved = make_subscription(other, [other.email], days=200)
+  gone = make_subscription(creator, [creator.email], days=-3)
+  moved.subscription_status = False
+  storage.save()
+  storage.delete(gone)
+  storage.save()
+  incremental = summary_rows()
+  storage.rebuild_subscription_summary()
+  assert incremental == summary_rows()
+  assert (other.id, False, "later", 1) in incremental
+
+
+def test_first_count_of_a_key_is_upserted(app):
+  """ Adding to a count without a row creates it, adding again updates
+  it, without either statement failing on the primary key
+  """
+  key = ("creator-id", True, "within_30")
+  engine = create_engine(environ["DATABASE_URL"])
+  try:
+    for delta in (1, 2):
+      with engine.begin() as connection:
+        apply_changes(connection, Counter({key: delta}), today())
+  finally:
+    engine.dispose()
+  assert summary_rows() == [key + (3,)]
+
+
+def test_models_load_no_unused_dialect():
+  """ Importing the models on SQLite does not import the MySQL dialect """
+  server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  subprocess.run([sys.executable, "-c",
+                  "import sys, models.subscription_summary; "
+                  "assert 'sqlalchemy.dialects.mysql' not in sys.modules"],
+                 cwd=server_dir, check=True,
+                 env=dict(environ, PYTHONPATH=server_dir))
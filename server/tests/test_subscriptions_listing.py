@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+""" Tests of the subscriptions dashboard listing """
+from models import storage
+
+stakeholders = ["first@aedc.test", "second@aedc.test"]
+
+
+def seed(make_user, make_subscription, count):
+  """ Adds count subscriptions with two stakeholders each, and copies
+  them to the replica the listing reads from
+  """
+  creator = storage.get_user_by_email("creator@aedc.test")
+  if creator is None:
+    creator = make_user("creator@aedc.test")
+    for email in stakeholders:
+      make_user(email)
+  for day in range(count):
+    make_subscription(creator, stakeholders, days=day + 1)
+  storage.close()
+
+
+def list_all(client, queries):
+  """ Gets every subscription in one page, returns the page and the
+  number of SQL statements it ran
+  """
+  start = queries.count
+  response = client.get("/api/v1/subscriptions?limit=1000")
+  assert response.status_code == 200
+  return response.get_json(), queries.count - start
+
+
+def test_listing_has_stakeholder_emails(client, make_user,
+                                        make_subscription, replica):
+  """ Every subscription comes with the emails of its stakeholders """
+  seed(make_user, make_subscription, 3)
+  replica()
+  body = client.get("/api/v1/subscriptions").get_json()
+  assert len(body) == 3
+  for row in body:
+    assert sorted(row["users"]) == stakeholders
+
+
+def test_listing_query_count_is_constant(client, make_user,
+                                         make_subscription, replica,
+                                         queries):
+  """ Listing 10 times more subscriptions runs as many statements """
+  seed(make_user, make_subscription, 10)
+  replica()
+  body, few = list_all(client, queries)
+  assert len(body) == 10
+  seed(make_user, make_subscription, 90)
+  replica()
+  body, many = list_all(client, queries)
+  assert len(body) == 100
+  assert 0 < many == few
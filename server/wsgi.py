@@ -0,0 +1,10 @@
+#!/usr/bin/python3
+""" Production entry points
+
+gunicorn -c gunicorn.conf.py wsgi:app
+celery -A wsgi.celery_app worker
+"""
+from api.v1.app import create_app
+
+app = create_app()
+celery_app = app.extensions.get("celery")